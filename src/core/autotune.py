@@ -0,0 +1,171 @@
+"""
+Adaptive worker count driven by measured throughput
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+class TransferMeter:
+    """Thread-safe counters of bytes and files finished by all workers"""
+    
+    def __init__(self):
+        self.bytes = 0
+        self.files = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        
+    def add(self, nbytes: int, files: int = 1):
+        """Count finished files and the bytes they moved"""
+        with self._lock:
+            self.bytes += nbytes
+            self.files += files
+            
+    def snapshot(self) -> Tuple[int, int, float]:
+        """Current totals (bytes, files) and the moment they were read"""
+        with self._lock:
+            return self.bytes, self.files, time.monotonic()
+            
+    def rate(self) -> float:
+        """Average bytes/s since the meter was created"""
+        elapsed = time.monotonic() - self.started
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+class ConcurrencyTuner:
+    """Tự điều chỉnh số worker theo thông lượng đo được (AIMD)
+    
+    Every interval the engine reports the aggregate bytes/s and files/s.
+    While a change raised throughput the tuner keeps adding workers step
+    by step; when throughput falls after an increase the worker count is
+    cut multiplicatively, extra workers that bought nothing are dropped
+    again, and after a few flat intervals it probes upwards again.
+    Bytes/s decides, files/s breaks ties in phases of small files where
+    bytes/s barely moves. The best count seen is saved per host so the
+    next run starts there.
+    """
+    
+    STATE_FILE = 'autotune.json'
+    
+    def __init__(self, config: Dict[str, Any]):
+        autotune = config.get('autotune', {})
+        self.enabled = bool(autotune.get('enable', False))
+        self.min_workers = max(1, int(autotune.get('min_workers', 2)))
+        self.max_workers = max(self.min_workers, int(autotune.get('max_workers', 32)))
+        self.interval = autotune.get('interval', 30)
+        self.step = max(1, int(autotune.get('step', 1)))
+        self.backoff = float(autotune.get('backoff', 0.75))
+        self.tolerance = float(autotune.get('tolerance', 0.1))
+        self.patience = max(1, int(autotune.get('patience', 3)))
+        
+        self.host = f"{config.get('ssh_user')}@{config.get('ssh_host')}:{config.get('remote_root')}"
+        self.state_path = Path(config.get('state_dir', 'state')) / self.STATE_FILE
+        
+        saved = self._load().get(self.host, {}).get('workers')
+        start = saved or autotune.get('start_workers', min(4, self.max_workers))
+        self.workers = self._clamp(int(start))
+        self.resumed = saved is not None
+        
+        self._last = None
+        self._direction = 1
+        self._flat = 0
+        self.best = None
+        
+    def _step(self) -> int:
+        """Workers added or removed per move
+        
+        At least a quarter of the current count, so a move changes
+        throughput by more than the noise tolerance even at high counts.
+        """
+        return max(self.step, self.workers // 4)
+        
+    def _clamp(self, workers: int) -> int:
+        return min(self.max_workers, max(self.min_workers, workers))
+        
+    def _load(self) -> Dict[str, Any]:
+        """Saved best worker counts by host"""
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+            
+    def save(self):
+        """Store the best worker count of this run for its host"""
+        if self.best is None:
+            return
+        data = self._load()
+        workers, (bytes_rate, files_rate) = self.best
+        data[self.host] = {
+            'workers': workers,
+            'bytes_per_sec': int(bytes_rate),
+            'files_per_sec': round(files_rate, 1),
+            'updated': datetime.now().isoformat()
+        }
+        tmp_path = self.state_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+        
+    def _gain(self, rates: Tuple[float, float], reference: Tuple[float, float]) -> float:
+        """Relative change of throughput, bytes/s first and files/s on a tie"""
+        def relative(new: float, old: float) -> float:
+            return (new - old) / old if old else (1.0 if new else 0.0)
+            
+        gain = relative(rates[0], reference[0])
+        if abs(gain) > self.tolerance:
+            return gain
+        return relative(rates[1], reference[1])
+        
+    def observe(self, bytes_rate: float, files_rate: float, ceiling: Optional[int] = None) -> int:
+        """Take one interval's throughput at the current count, return the next count
+        
+        ceiling caps the result below max_workers, e.g. a schedule window.
+        """
+        rates = (bytes_rate, files_rate)
+        # A higher count only becomes the best when it is clearly faster
+        if self.best is None or self.workers == self.best[0] or \
+                self._gain(rates, self.best[1]) > self.tolerance:
+            self.best = (self.workers, rates)
+            
+        if self._last is None:
+            # First measurement: probe upwards straight away
+            gain = 0.0
+            self._flat = self.patience - 1
+        else:
+            gain = self._gain(rates, self._last)
+        self._last = rates
+        
+        if gain > self.tolerance:
+            # The last move helped: keep going the same way
+            self._flat = 0
+            workers = self.workers + self._direction * self._step()
+        elif gain < -self.tolerance or (self._direction > 0 and self.workers > self.best[0]
+                                        and self._gain(rates, self.best[1]) < -self.tolerance):
+            # Worse than the last interval, or slowly sliding below the best while climbing
+            self._flat = 0
+            if self._direction > 0:
+                # More workers made it worse: the link or the remote disk is saturated
+                workers = int(self.workers * self.backoff)
+                self._direction = -1
+            else:
+                # Fewer workers made it worse: go back up
+                workers = self.workers + self._step()
+                self._direction = 1
+        else:
+            # Flat: extra workers bought nothing, so drop them; hold and
+            # probe for headroom again now and then
+            self._flat += 1
+            workers = min(self.workers, self.best[0])
+            if self._flat >= self.patience:
+                self._flat = 0
+                self._direction = 1
+                workers = self.workers + self._step()
+                
+        self.workers = self._clamp(workers)
+        if ceiling:
+            self.workers = max(1, min(self.workers, ceiling))
+        return self.workers
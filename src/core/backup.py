@@ -2,16 +2,65 @@
 Backup engine core functionality
 """
 
+import heapq
 import os
+import queue
+import shlex
+import shutil
 import subprocess
 import threading
 import time
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, List, Optional, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
 
-from .ssh import SSHManager, NetworkInterfaceMonitor
+from .ssh import SSHManager, NetworkInterfaceMonitor, STREAM_COMPRESSORS
+from .config import parse_rate, parse_size
+from .filelist import (
+    RECORD_SEPARATOR, BatchWriter, build_find_command, build_split_command, decode_path,
+    encode_path, follow_listing, iter_listing, iter_records, open_records,
+    select_within_budget, write_listing_record
+)
+from .manifest import ManifestStore
+from .journal import (
+    CompletionJournal, FILE_DENIED, JOURNAL_ITEMIZE, JOURNAL_OUT_FORMAT, PARTIAL_EXIT_CODES,
+    SETTLED_KINDS, parse_done_record, parse_error_line, parse_tar_error_line, unescape_tar_name
+)
+from .state import RunState
+from .ranges import RangeTransfer
+from .retention import COMPLETE_MARKER
+from .bandwidth import BandwidthGovernor, BandwidthLease
+from .schedule import TransferSchedule, WorkerGate
+from .autotune import ConcurrencyTuner, TransferMeter
+from .watchdog import StallWatchdog, TransferProcesses
+from .retry import CONNECTION_EXIT_CODES, CircuitBreaker, backoff_delay
+
+# Write buffer per chunk file when partitioning the listing
+CHUNK_WRITE_BUFFER = 1024 * 1024
+
+# Read size for transfer output; rsync --progress updates carry no newline
+OUTPUT_READ_SIZE = 64 * 1024
+
+# Block size when passing a tar lane archive on to the local extractor
+ARCHIVE_PUMP_BLOCK = 1024 * 1024
+
+# GNU tar exit code for "file changed as we read it": the archive is complete
+TAR_FILE_CHANGED = 1
+
+# File name prefix of tar lane batches, which are streamed with tar instead of rsync
+TAR_BATCH_PREFIX = 'tar'
+
+# File name prefix of single-file chunks fetched as parallel byte ranges
+RANGE_CHUNK_PREFIX = 'range'
+
+# Where rsync keeps a half-transferred file when it is stopped, so the
+# restart continues it instead of starting the file over
+RSYNC_PARTIAL_DIR = '.vpsb-partial'
+
+def _escape_field(path: str) -> str:
+    """Escape a path for one tab-separated field of a text report"""
+    return path.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
 
 class BackupEngine:
     """Core backup engine với rsync và monitoring"""
@@ -21,22 +70,92 @@ class BackupEngine:
         self.ssh_manager = SSHManager(config)
         self.network_monitor = NetworkInterfaceMonitor(self.ssh_manager)
         self.bandwidth_monitor = None
+        self.manifest = None
         self._setup_directories()
         
+        # Per-run working directory (listing, chunks, journal)
+        self.work_dir = Path(self.config.get('tmp_dir', 'tmp'))
+        self.journal = CompletionJournal(self.work_dir / 'journal')
+        self.run_state = None
+        
+        # Where rsync writes: local_root, or a snapshot directory below it
+        self.destination = self.config['local_root']
+        self.link_dest = None
+        
+        # bwlimit is a budget for all workers together, not per rsync
+        self.governor = BandwidthGovernor(
+            parse_rate(self.config.get('bwlimit', 0)),
+            measure=self._measured_rate,
+            interval=self.config.get('monitoring_interval', 10),
+            concurrency=lambda: self.worker_gate.limit
+        )
+        
+        # Time-of-day limits, applied live to the governor and the worker gate
+        self.schedule = TransferSchedule(self.config)
+        self.worker_gate = WorkerGate(self.config.get('threads', 4))
+        self._schedule_window = None
+        self._schedule_stop = threading.Event()
+        self._schedule_thread = None
+        self._worker_ceiling = self.worker_gate.limit
+        
+        # Optional auto-tuning of the worker count from measured throughput
+        self.meter = TransferMeter()
+        self.tuner = ConcurrencyTuner(self.config)
+        self._autotune_stop = threading.Event()
+        self._autotune_thread = None
+        
+        # Exponential backoff between retries; the breaker pauses every
+        # worker while the host cannot be reached
+        retry = self.config.get('retry', {})
+        self.retry_base_delay = retry.get('base_delay', self.config.get('retry_delay', 10))
+        self.retry_max_delay = retry.get('max_delay', 300)
+        self.breaker = CircuitBreaker(
+            probe=lambda: self.ssh_manager.test_connection()[0],
+            threshold=retry.get('breaker_threshold', 3),
+            probe_interval=retry.get('probe_interval', 15),
+            max_outage=retry.get('max_outage', 3600)
+        )
+        
+        # Every running transfer process, so stop() can end the run at once
+        self.transfers = TransferProcesses()
+        
+        # Range transfers open `streams` ssh sessions each; the pool is sized
+        # for this many at once
+        self.range_concurrency = max(1, int(self.config.get('large_files', {}).get('concurrent_files', 2)))
+        self.range_slots = threading.BoundedSemaphore(self.range_concurrency)
+        
+    def stop(self):
+        """Stop the run: kill running transfers and start no new ones
+        
+        Chunks cut off this way stay pending in the run state, so the run
+        can be resumed later.
+        """
+        self.transfers.stop()
+        self.breaker.cancel()
+        
+    @property
+    def stopped(self) -> bool:
+        return self.transfers.stopped.is_set()
+        
     def _setup_directories(self):
         """Tạo các thư mục cần thiết"""
         directories = [
             self.config['local_root'],
             self.config.get('tmp_dir', 'tmp'),
-            self.config.get('log_dir', 'logs')
+            self.config.get('log_dir', 'logs'),
+            self.config.get('state_dir', 'state')
         ]
         
         for directory in directories:
             Path(directory).mkdir(parents=True, exist_ok=True)
             
-    def build_file_list(self) -> str:
-        """Build full file list from remote server"""
-        tmp_all = Path(self.config.get('tmp_dir', 'tmp')) / 'all_files.txt'
+    def build_file_list(self, since: Optional[int] = None) -> str:
+        """Build full file list from remote server
+        
+        With since (remote epoch seconds) only files changed after that
+        moment are listed.
+        """
+        tmp_all = self.work_dir / 'all_files.txt'
         
         # Get timeout from config
         file_list_timeout = self.config.get('timeout', {}).get('file_list', 3600)  # Default 1 hour
@@ -46,91 +165,504 @@ class BackupEngine:
             multiplier = self.config.get('longterm', {}).get('timeout_multiplier', 10)
             file_list_timeout *= multiplier
         
+        # Optional on-the-wire compression of the listing (none, gzip, zstd)
+        compression = self.config.get('listing', {}).get('compression', 'none')
+        
         print(f"📋 Building file list from remote server... (timeout: {file_list_timeout//60} minutes)")
+        if since is not None:
+            print(f"   Only files changed since {datetime.fromtimestamp(since)} (remote time)")
+            
+        # Several find processes over separate subtrees on fast remote disks
+        parallel = int(self.config.get('listing', {}).get('parallel', 1))
+        if parallel > 1:
+            self._build_file_list_parallel(tmp_all, since, parallel, file_list_timeout, compression)
+            return str(tmp_all)
+            
+        # Exclude/include patterns of the backup type are applied by find itself
+        type_config = self._backup_type_config()
         
-        # SSH command to find files
-        find_cmd = f'find "{self.config["remote_root"]}" -type f'
-        success, stdout, stderr = self.ssh_manager.run_command(find_cmd, timeout=file_list_timeout)
+        # SSH command to find files, streamed straight into the listing file
+        find_cmd = build_find_command(
+            self.config['remote_root'],
+            since=since,
+            exclude_patterns=type_config.get('exclude_patterns'),
+            include_patterns=type_config.get('include_patterns')
+        )
+        success, stderr = self.ssh_manager.stream_command(
+            find_cmd,
+            str(tmp_all),
+            timeout=file_list_timeout,
+            compression=compression
+        )
         
         if not success:
             raise RuntimeError(f"Failed to build file list: {stderr}")
             
-        # Write file list to temp file
-        with open(tmp_all, 'w') as f:
-            f.write(stdout)
-            
         return str(tmp_all)
         
+    def _build_file_list_parallel(self, tmp_all: Path, since: Optional[int], parallel: int,
+                                  timeout: int, compression: str):
+        """Walk the remote tree with several find processes at once
+        
+        The directories split_depth levels below remote_root are found
+        first. Each gets its own find over a pool slot, plus one find for
+        the files above that depth. A part is appended to the listing as
+        soon as its find finishes, so a pipeline following the listing
+        picks up the parts as they complete.
+        """
+        type_config = self._backup_type_config()
+        exclude_patterns = type_config.get('exclude_patterns')
+        include_patterns = type_config.get('include_patterns')
+        depth = max(1, int(self.config.get('listing', {}).get('split_depth', 1)))
+        remote_root = self.config['remote_root']
+        
+        parts_dir = self.work_dir / 'listing_parts'
+        if parts_dir.exists():
+            shutil.rmtree(parts_dir)
+        parts_dir.mkdir(parents=True)
+        
+        split_file = parts_dir / 'split_dirs.txt'
+        success, stderr = self.ssh_manager.stream_command(
+            build_split_command(remote_root, depth, exclude_patterns),
+            str(split_file),
+            timeout=timeout,
+            compression=compression
+        )
+        if not success:
+            raise RuntimeError(f"Failed to list directories to split on: {stderr}")
+            
+        # Files down to split_depth in one walk, then one walk per split directory
+        walks = [(remote_root, depth)]
+        for record in iter_records(split_file):
+            level, _, path = decode_path(record).partition('\t')
+            if level == str(depth) and path:
+                walks.append((path, None))
+                
+        print(f"   Splitting the walk into {len(walks)} parts, {parallel} find processes at once")
+        open(tmp_all, 'wb').close()
+        merge_lock = threading.Lock()
+        
+        def walk(index: int, root: str, max_depth: Optional[int]) -> Tuple[bool, str]:
+            part = parts_dir / f'part_{index:05d}.txt'
+            find_cmd = build_find_command(
+                root,
+                since=since,
+                exclude_patterns=exclude_patterns,
+                include_patterns=include_patterns,
+                max_depth=max_depth
+            )
+            ok, error = self.ssh_manager.stream_command(
+                find_cmd, str(part), timeout=timeout, compression=compression, slot=index
+            )
+            if ok:
+                with merge_lock, open(part, 'rb') as src, open(tmp_all, 'ab') as dst:
+                    shutil.copyfileobj(src, dst, CHUNK_WRITE_BUFFER)
+                part.unlink()
+            return ok, f"{root}: {error}"
+            
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            futures = [executor.submit(walk, idx, root, max_depth)
+                       for idx, (root, max_depth) in enumerate(walks)]
+            errors = [error for ok, error in (future.result() for future in futures) if not ok]
+            
+        if errors:
+            raise RuntimeError(f"Failed to build file list: {errors[0]}")
+            
+    def _count_records(self, path: str, bufsize: int = 1024 * 1024) -> int:
+        """Count NUL-terminated records of a file in fixed-size binary blocks"""
+        count = 0
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(bufsize)
+                if not block:
+                    break
+                count += block.count(RECORD_SEPARATOR)
+        return count
+        
+    def _backup_type_config(self) -> Dict[str, Any]:
+        """Settings of the current entry in backup_types"""
+        backup_type = getattr(self, 'backup_type', 'full')
+        return self.config.get('backup_types', {}).get(backup_type, {}) or {}
+        
+    def _incremental_enabled(self) -> bool:
+        """Check whether incremental mode applies to the current backup type"""
+        if 'enable' in self.config.get('incremental', {}):
+            return bool(self.config['incremental']['enable'])
+        return bool(self._backup_type_config().get('enable_incremental', False))
+        
+    def open_manifest(self) -> ManifestStore:
+        """Open the manifest database of the configured remote source"""
+        if self.manifest is None:
+            default_path = Path(self.config.get('state_dir', 'state')) / 'manifest.db'
+            db_path = self.config.get('incremental', {}).get('manifest_path', default_path)
+            source = f"{self.ssh_manager.target}:{self.config['remote_root'].rstrip('/')}"
+            self.manifest = ManifestStore(str(db_path), source)
+        return self.manifest
+        
+    def _remote_time(self) -> Optional[int]:
+        """Current time on the remote server (epoch seconds)"""
+        success, stdout, _ = self.ssh_manager.run_command('date +%s')
+        try:
+            return int(stdout) if success else None
+        except ValueError:
+            return None
+            
+    def _changes_since(self) -> Optional[int]:
+        """Remote timestamp to list changes from, None for a full scan
+        
+        Server-side change detection only lists files changed since the
+        last successful run. A full reconciliation scan is forced every
+        full_scan_every_days days, or when no baseline exists yet.
+        """
+        incremental = self.config.get('incremental', {})
+        if not incremental.get('server_side', False):
+            return None
+            
+        manifest = self.open_manifest()
+        last_run = manifest.get_meta('last_run_remote_time')
+        last_full = manifest.get_meta('last_full_scan_remote_time')
+        if last_run is None or last_full is None or manifest.file_count() == 0:
+            return None
+            
+        full_every = float(incremental.get('full_scan_every_days', 7)) * 86400
+        if int(last_run) - int(last_full) >= full_every:
+            return None
+            
+        return int(last_run)
+        
+    def filter_changed_files(self, all_files: str) -> str:
+        """Reduce the listing to files that are new or changed since the last run
+        
+        The listing is staged into the manifest database and diffed against
+        the previous successful run; only new or modified paths (by size,
+        mtime or inode) are written to the returned listing.
+        """
+        manifest = self.open_manifest()
+        remote_root = self.config['remote_root']
+        changed_files = self.work_dir / 'changed_files.txt'
+        
+        manifest.stage_listing(iter_listing(all_files, remote_root))
+        
+        with open_records(changed_files, 'w', buffering=CHUNK_WRITE_BUFFER) as f:
+            for entry in manifest.iter_changed():
+                write_listing_record(f, entry, remote_root)
+                
+        return str(changed_files)
+        
+    def select_within_budget(self, all_files: str, budget: int) -> str:
+        """Reduce the listing to a prioritized subset within max_size bytes"""
+        type_config = self._backup_type_config()
+        remote_root = self.config['remote_root']
+        selected_files = self.work_dir / 'selected_files.txt'
+        
+        selected = select_within_budget(
+            lambda: iter_listing(all_files, remote_root),
+            budget,
+            order=type_config.get('selection', 'recent'),
+            priority_paths=type_config.get('priority_paths')
+        )
+        
+        with open_records(selected_files, 'w', buffering=CHUNK_WRITE_BUFFER) as f:
+            for entry in selected:
+                write_listing_record(f, entry, remote_root)
+                
+        return str(selected_files)
+        
     def chunk_file_list(self, all_files: str) -> List[str]:
-        """Chunk file list into N parts for parallel processing"""
-        with open(all_files) as f:
-            lines = [line.strip() for line in f if line.strip()]
-            
-        # Remove remote_root prefix from paths
-        remote_root = self.config['remote_root'].rstrip('/')
-        processed_lines = []
-        
-        for line in lines:
-            if line.startswith(remote_root):
-                relative_path = line[len(remote_root):].lstrip('/')
-                if relative_path:
-                    processed_lines.append(relative_path)
+        """Chunk file list into N parts for parallel processing
+        
+        Single pass over the listing: the remote_root prefix is stripped on
+        the fly and each path goes straight to its chunk through buffered
+        writers, so memory use does not depend on the number of files.
+        
+        With the default 'size' strategy chunks are balanced by bytes instead
+        of file count, and files above dedicated_lane_threshold get a chunk of
+        their own.
+        """
+        chunking = self.config.get('chunking', {})
+        n_threads = self.config.get('threads', 4)
+        tmp_dir = self.work_dir
+        
+        chunks = [str(tmp_dir / f'chunk_{i+1}.txt') for i in range(n_threads)]
+        writers = [open_records(chunk, 'w', buffering=CHUNK_WRITE_BUFFER) for chunk in chunks]
+        self.chunk_bytes = {}
+        
+        try:
+            if chunking.get('strategy', 'size') == 'round_robin':
+                loads = self._partition_round_robin(all_files, writers)
+                lanes = []
             else:
-                processed_lines.append(line)
+                loads, lanes = self._partition_by_size(all_files, writers, chunking)
+        finally:
+            for writer in writers:
+                writer.close()
                 
-        # Create chunks
-        n_threads = self.config.get('threads', 4)
-        chunks = []
-        tmp_dir = Path(self.config.get('tmp_dir', 'tmp'))
+        # Dedicated lanes for very large files
+        for path, size in lanes:
+            chunk_path = str(tmp_dir / f'chunk_{len(chunks)+1}.txt')
+            with open_records(chunk_path, 'w') as f:
+                f.write(path + '\0')
+            chunks.append(chunk_path)
+            loads.append(size)
+            
+        self.chunk_bytes = dict(zip(chunks, loads))
+        
+        if loads:
+            print(f"⚖️  Chunk sizes: min {self._format_size(min(loads))}, "
+                  f"max {self._format_size(max(loads))}, "
+                  f"{len(lanes)} dedicated lane(s)")
+                  
+        return chunks
+        
+    def batch_file_list(self, all_files: str) -> List[str]:
+        """Split file list into many small batches for dynamic scheduling
+        
+        A batch is closed once it reaches batch_files paths or batch_bytes
+        bytes, whichever comes first. Workers pull batches from a shared
+        queue as they free up, so a slow batch never holds back the rest.
+        """
+        scheduling = self.config.get('scheduling', {})
+        max_files = int(scheduling.get('batch_files', 5000))
+        max_bytes = parse_size(scheduling.get('batch_bytes', '1GB'))
+        
+        batches, self.chunk_bytes = self._write_batches(
+            iter_listing(all_files, self.config['remote_root']),
+            self.work_dir / 'batches', 'batch', max_files, max_bytes
+        )
+        return batches
+        
+    def _write_batches(self, entries, batch_dir: Path, prefix: str, max_files: int,
+                       max_bytes: int) -> Tuple[List[str], Dict[str, int]]:
+        """Write entries into numbered batch files of bounded files and bytes"""
+        if batch_dir.exists():
+            shutil.rmtree(batch_dir)
+        batch_dir.mkdir(parents=True)
+        
+        writer = BatchWriter(batch_dir, prefix, max_files, max_bytes, buffering=CHUNK_WRITE_BUFFER)
+        try:
+            for entry in entries:
+                writer.add(entry)
+        finally:
+            writer.close()
+            
+        return writer.batches, writer.batch_bytes
+        
+    def split_large_files(self, all_files: str) -> Tuple[str, List[str]]:
+        """Move files above large_files.threshold into single-file range chunks
+        
+        A threshold of 0 turns the range lane off.
+        """
+        threshold = parse_size(self.config.get('large_files', {}).get('threshold', '50GB'))
+        remote_root = self.config['remote_root']
         
-        for i in range(n_threads):
-            chunk_path = tmp_dir / f'chunk_{i+1}.txt'
-            chunks.append(str(chunk_path))
+        range_dir = self.work_dir / 'ranges'
+        if range_dir.exists():
+            shutil.rmtree(range_dir)
+        range_dir.mkdir(parents=True)
+        
+        range_chunks = []
+        self.range_bytes = {}
+        rest_files = self.work_dir / 'regular_files.txt'
+        with open_records(rest_files, 'w', buffering=CHUNK_WRITE_BUFFER) as rest:
+            for entry in iter_listing(all_files, remote_root):
+                if not threshold or entry.size < threshold:
+                    write_listing_record(rest, entry, remote_root)
+                    continue
+                    
+                chunk_path = self._write_range_chunk(range_dir, entry.path, len(range_chunks) + 1)
+                range_chunks.append(chunk_path)
+                self.range_bytes[chunk_path] = entry.size
+                
+        return str(rest_files), range_chunks
+        
+    def _write_range_chunk(self, range_dir: Path, path: str, number: int) -> str:
+        """Write the single-file list of a range chunk"""
+        chunk_path = str(range_dir / f'{RANGE_CHUNK_PREFIX}_{number:05d}.txt')
+        with open_records(chunk_path, 'w') as f:
+            f.write(path + '\0')
+        return chunk_path
+        
+    def _use_tar_lane(self, since: Optional[int]) -> bool:
+        """Check whether small files go through the tar lane in this run"""
+        tar_lane = self.config.get('tar_lane', {})
+        if not tar_lane.get('enable', False):
+            return False
+        if not tar_lane.get('first_backup_only', True):
+            return True
             
-            with open(chunk_path, 'w') as f:
-                for idx, line in enumerate(processed_lines):
-                    if idx % n_threads == i:
-                        f.write(line + '\n')
+        # First full backup: no previous copy rsync could send deltas against
+        destination = Path(self.destination)
+        return since is None and self.link_dest is None and \
+            not (destination.exists() and any(destination.iterdir()))
+            
+    def split_tar_lane(self, all_files: str) -> Tuple[str, List[str]]:
+        """Move small files and crowded directories out of the listing into tar batches
+        
+        Files below small_file_threshold, and every file of a directory
+        holding at least dir_file_threshold files, are written to tar batch
+        files. Everything else stays in the returned listing for rsync.
+        """
+        tar_lane = self.config.get('tar_lane', {})
+        small_threshold = parse_size(tar_lane.get('small_file_threshold', '64KB'))
+        dir_threshold = int(tar_lane.get('dir_file_threshold', 10000))
+        max_files = int(tar_lane.get('batch_files', 20000))
+        max_bytes = parse_size(tar_lane.get('batch_bytes', '1GB'))
+        remote_root = self.config['remote_root']
+        
+        # First pass: directories with too many files for per-file rsync
+        crowded = set()
+        if dir_threshold:
+            dir_counts = {}
+            for entry in iter_listing(all_files, remote_root):
+                parent = os.path.dirname(entry.path)
+                dir_counts[parent] = dir_counts.get(parent, 0) + 1
+            crowded = {path for path, count in dir_counts.items() if count >= dir_threshold}
+            del dir_counts
+            
+        rsync_files = self.work_dir / 'rsync_files.txt'
+        with open_records(rsync_files, 'w', buffering=CHUNK_WRITE_BUFFER) as rest:
+            def tar_entries():
+                for entry in iter_listing(all_files, remote_root):
+                    if entry.size < small_threshold or os.path.dirname(entry.path) in crowded:
+                        yield entry
+                    else:
+                        write_listing_record(rest, entry, remote_root)
                         
-        return chunks
+            batches, self.tar_bytes = self._write_batches(
+                tar_entries(), self.work_dir / 'tar', TAR_BATCH_PREFIX, max_files, max_bytes
+            )
+            
+        return str(rsync_files), batches
         
-    def rsync_chunk(self, chunk_path: str, chunk_idx: int, retry_count: int = 0) -> Tuple[bool, str]:
-        """Execute rsync for a specific chunk with retry logic"""
-        log_path = Path(self.config.get('log_dir', 'logs')) / f'chunk_{chunk_idx+1}.log'
+    def _partition_round_robin(self, all_files: str, writers: list) -> List[int]:
+        """Assign files to chunks by line index"""
+        loads = [0] * len(writers)
         
-        # Build rsync command with better timeout handling
-        ssh_cmd = f"ssh -i {Path(self.config['ssh_key']).expanduser()} -p {self.config.get('ssh_port', 22)} -o ConnectTimeout=30 -o ServerAliveInterval=60"
-        remote_root = self.config['remote_root'].rstrip('/') + '/'
+        for idx, entry in enumerate(iter_listing(all_files, self.config['remote_root'])):
+            slot = idx % len(writers)
+            writers[slot].write(entry.path + '\0')
+            loads[slot] += entry.size
+            
+        return loads
         
-        # Get timeout for chunks from config
-        chunk_timeout = self.config.get('timeout', {}).get('rsync_chunk', 3600)
-        if hasattr(self, 'backup_type') and self.backup_type == 'longterm':
-            multiplier = self.config.get('longterm', {}).get('timeout_multiplier', 10)
-            chunk_timeout *= multiplier
+    def _partition_by_size(self, all_files: str, writers: list,
+                           chunking: Dict[str, Any]) -> Tuple[List[int], List[Tuple[str, int]]]:
+        """Balance chunks by bytes with greedy largest-first bin packing
         
-        rsync_cmd = [
-            'rsync',
-            f"--files-from={chunk_path}",
-            '-e', ssh_cmd,
-            f"--bwlimit={self.config.get('bwlimit', 0)}"
-        ]
+        Files at or above sort_threshold are collected and placed largest
+        first on the lightest chunk; the long tail of small files is then
+        streamed onto the lightest chunk in a second pass, so only the large
+        files are ever held in memory.
+        """
+        lane_threshold = parse_size(chunking.get('dedicated_lane_threshold', 0))
+        sort_threshold = parse_size(chunking.get('sort_threshold', '1MB'))
+        remote_root = self.config['remote_root']
+        
+        large = []
+        lanes = []
+        for entry in iter_listing(all_files, remote_root):
+            if lane_threshold and entry.size >= lane_threshold:
+                lanes.append((entry.path, entry.size))
+            elif entry.size >= sort_threshold:
+                large.append((entry.size, entry.path))
+                
+        large.sort(reverse=True)
+        
+        # Min-heap of (bytes assigned, chunk index)
+        heap = [(0, i) for i in range(len(writers))]
+        
+        for size, path in large:
+            load, slot = heapq.heappop(heap)
+            writers[slot].write(path + '\0')
+            heapq.heappush(heap, (load + size, slot))
+        del large
         
-        # Add rsync options from config (they already include timeout)
-        rsync_opts = self.config.get('rsync_opts', ['--archive', '--compress'])
-        rsync_cmd.extend(rsync_opts)
+        for entry in iter_listing(all_files, remote_root):
+            if entry.size >= sort_threshold or (lane_threshold and entry.size >= lane_threshold):
+                continue
+            load, slot = heapq.heappop(heap)
+            writers[slot].write(entry.path + '\0')
+            heapq.heappush(heap, (load + entry.size, slot))
+            
+        loads = [0] * len(writers)
+        for load, slot in heap:
+            loads[slot] = load
+            
+        return loads, lanes
+        
+    def rsync_chunk(self, chunk_path: str, chunk_idx: int, retry_count: int = 0) -> Tuple[bool, str]:
+        """Execute rsync for a specific chunk with retry logic"""
+        log_path = Path(self.config.get('log_dir', 'logs')) / f'{Path(chunk_path).stem}.log'
         
-        # Add source and destination
-        rsync_cmd.extend([
-            f"{self.config['ssh_user']}@{self.config['ssh_host']}:{remote_root}",
-            self.config['local_root']
-        ])
+        # Build rsync command with better timeout handling
+        # Multiplexed over the shared SSH master connections
+        ssh_cmd = self.ssh_manager.rsync_ssh_command(slot=chunk_idx)
+        remote_root = self.config['remote_root'].rstrip('/') + '/'
         
         max_retries = self.config.get('retry_count', 3)
+        attempt = 0
+        restarts = 0
         
-        for attempt in range(max_retries + 1):
+        while attempt <= max_retries:
+            if self.stopped:
+                return False, f"Stopped: {log_path}"
+                
+            # Skip files already journaled as done by earlier attempts, and
+            # files that vanished or were denied: retrying them changes nothing
+            settled = self._settled_files(chunk_path)
+            files_from, remaining = self.journal.pending_list(chunk_path, skip=settled)
+            if remaining == 0:
+                return self._settled_result(settled, log_path)
+                
+            # Hold off while the host is unreachable instead of burning attempts
+            self.breaker.wait()
+            
+            # This invocation's share of the global bandwidth budget
+            lease = self.governor.acquire()
+            
+            rsync_cmd = [
+                'rsync',
+                f"--files-from={files_from}",
+                '--from0',
+                '-e', ssh_cmd,
+                f"--bwlimit={lease.bwlimit_kbps}"
+            ]
+            
+            # Add rsync options from config (they already include timeout)
+            rsync_opts = self.config.get('rsync_opts', ['--archive', '--compress'])
+            rsync_cmd.extend(rsync_opts)
+            
+            # Progress output keeps the stall watchdog fed during one huge file,
+            # the -ii lines below while rsync checks up-to-date files
+            if not any(opt in ('--progress', '-P') or opt.startswith('--info=progress') for opt in rsync_opts):
+                rsync_cmd.append('--info=progress2')
+                
+            # The governor, the schedule and the watchdog stop running rsyncs:
+            # keep the file in flight so the next run resumes it
+            if not any(opt == '-P' or opt.startswith('--partial') for opt in rsync_opts):
+                rsync_cmd.append(f"--partial-dir={RSYNC_PARTIAL_DIR}")
+                
+            # Exclude patterns as rsync filter rules too, in case find missed them
+            for pattern in self._backup_type_config().get('exclude_patterns') or []:
+                rsync_cmd.append(f"--exclude={pattern}")
+                
+            # One line per finished or up-to-date file feeds the completion
+            # journal, so a retry never checks the same unchanged files again
+            rsync_cmd.extend([f"--out-format={JOURNAL_OUT_FORMAT}", JOURNAL_ITEMIZE])
+            
+            # Add source and destination
+            # Unchanged files become hard links into the previous snapshot
+            if self.link_dest:
+                rsync_cmd.append(f"--link-dest={self.link_dest}")
+                
+            rsync_cmd.extend([
+                f"{self.config['ssh_user']}@{self.config['ssh_host']}:{remote_root}",
+                self.destination
+            ])
+            
             try:
                 # Log attempt
-                mode = 'a' if attempt > 0 else 'w'
+                mode = 'a' if attempt > 0 or restarts > 0 else 'w'
                 with open(log_path, mode) as log_file:
                     if attempt > 0:
                         log_file.write(f"\n=== RETRY ATTEMPT {attempt}/{max_retries} ===\n")
@@ -139,54 +671,632 @@ class BackupEngine:
                     log_file.write(f"Started: {datetime.now()}\n")
                     log_file.flush()
                     
-                    # Set longer timeout for long-term backups
-                    timeout = self.config.get('rsync_timeout', 7200)  # 2 hours default
-                    if hasattr(self, 'backup_type') and 'longterm' in str(getattr(self, 'backup_type', '')):
-                        timeout = 14400  # 4 hours for longterm
-                    
-                    result = subprocess.run(
-                        rsync_cmd,
-                        stdout=log_file,
-                        stderr=subprocess.STDOUT,
-                        timeout=timeout
-                    )
+                    file_errors = {}
+                    returncode = self._run_rsync(rsync_cmd, chunk_path, log_file, lease, file_errors)
                     
                     log_file.write(f"\nFinished: {datetime.now()}\n")
-                    log_file.write(f"Return code: {result.returncode}\n")
-                    
-                if result.returncode == 0:
+                    log_file.write(f"Return code: {returncode}\n")
+                    if file_errors:
+                        kinds = [kind for kind, _ in file_errors.values()]
+                        log_file.write("File errors: " + ", ".join(
+                            f"{kinds.count(kind)} {kind}" for kind in sorted(set(kinds))) + "\n")
+                            
+                self.journal.record_errors(chunk_path, file_errors)
+                if lease.rebalanced:
+                    # Stopped by the governor, not a failure: go again with the new share
+                    restarts += 1
+                    with open(log_path, 'a') as log_file:
+                        log_file.write("\n=== RESTART WITH NEW BANDWIDTH SHARE ===\n")
+                    continue
+                self.breaker.record(returncode not in CONNECTION_EXIT_CODES)
+                if returncode == 0:
                     return True, str(log_path)
-                elif attempt < max_retries:
+                    
+                # Only vanished or denied files failed: everything else is up to
+                # date, so the chunk is decided without another pass
+                if returncode in PARTIAL_EXIT_CODES and file_errors and \
+                        all(kind in SETTLED_KINDS for kind, _ in file_errors.values()):
+                    settled.update((path, kind) for path, (kind, _) in file_errors.items())
+                    return self._settled_result(settled, log_path)
+                    
+                if attempt < max_retries:
                     print(f"   Chunk {chunk_idx+1}: ⚠️ Failed (attempt {attempt+1}), retrying...")
-                    import time
-                    time.sleep(self.config.get('retry_delay', 10))  # Wait before retry
+                    self._retry_pause(attempt)
+                    attempt += 1
                     continue
                 else:
                     return False, f"Failed after {max_retries} retries: {log_path}"
                     
             except subprocess.TimeoutExpired:
+                # A stall says nothing about the link: a lost connection
+                # ends ssh with 255, which the breaker already counts
                 if attempt < max_retries:
-                    print(f"   Chunk {chunk_idx+1}: ⏰ Timeout (attempt {attempt+1}), retrying...")
+                    print(f"   Chunk {chunk_idx+1}: ⏰ Stalled (attempt {attempt+1}), retrying...")
                     with open(log_path, 'a') as log_file:
                         log_file.write(f"\nTIMEOUT at: {datetime.now()}\n")
-                    import time
-                    time.sleep(self.config.get('retry_delay', 10))
+                    self._retry_pause(attempt)
+                    attempt += 1
                     continue
                 else:
-                    return False, f"Timeout after {max_retries} retries: {log_path}"
+                    return False, f"Stalled after {max_retries} retries: {log_path}"
             except Exception as e:
                 if attempt < max_retries:
                     print(f"   Chunk {chunk_idx+1}: ❌ Error (attempt {attempt+1}), retrying...")
                     with open(log_path, 'a') as log_file:
                         log_file.write(f"\nERROR at: {datetime.now()}: {str(e)}\n")
-                    import time
-                    time.sleep(self.config.get('retry_delay', 10))
+                    self._retry_pause(attempt)
+                    attempt += 1
                     continue
                 else:
                     return False, f"Error after {max_retries} retries: {str(e)}"
-                    
+            finally:
+                self.governor.release(lease)
+                
         return False, f"Unexpected failure: {log_path}"
+        
+    def _settled_files(self, chunk_path: str) -> Dict[str, str]:
+        """Files of a chunk that vanished or were denied, by path"""
+        return {path: kind for path, (kind, _) in self.journal.file_errors(chunk_path).items()
+                if kind in SETTLED_KINDS}
+                
+    def _settled_result(self, settled: Dict[str, str], log_path: Path) -> Tuple[bool, str]:
+        """Outcome of a chunk whose only failed files vanished or were denied"""
+        denied = sum(1 for kind in settled.values() if kind == FILE_DENIED)
+        if denied:
+            return False, f"{denied} files could not be read (permission denied): {log_path}"
+        return True, str(log_path)
+        
+    def _run_rsync(self, rsync_cmd: List[str], chunk_path: str, log_file,
+                   lease: Optional[BandwidthLease] = None,
+                   file_errors: Optional[Dict[str, Tuple[str, str]]] = None) -> int:
+        """Run rsync, copying its output to the log and journaling finished files
+        
+        Every piece of output counts as progress for the stall watchdog,
+        including the carriage-return progress updates within one file.
+        Per-file errors are collected into file_errors (path -> (kind, reason)).
+        """
+        process = subprocess.Popen(rsync_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.transfers.add(process)
+        if lease is not None:
+            self.governor.attach(lease, process)
+        watchdog = self._start_watchdog([process], chunk_path)
+        
+        def handle_line(raw_line: bytes):
+            log_file.write(raw_line.decode('utf-8', errors='replace'))
+            # Progress updates may precede a message on the same line; paths
+            # keep their exact bytes for the journal
+            line = decode_path(raw_line.rsplit(b'\r', 1)[-1])
+            record = parse_done_record(line)
+            if record is not None:
+                journal.add(record[0])
+                self.meter.add(record[1])
+            elif file_errors is not None:
+                error = parse_error_line(line, self.config['remote_root'])
+                if error is not None:
+                    kind, path, reason = error
+                    file_errors[path] = (kind, reason)
+                    
+        try:
+            with self.journal.open_writer(chunk_path) as journal:
+                pending = b''
+                while True:
+                    data = process.stdout.read1(OUTPUT_READ_SIZE)
+                    if not data:
+                        break
+                    watchdog.progress()
+                    *lines, pending = (pending + data).split(b'\n')
+                    for raw_line in lines:
+                        handle_line(raw_line + b'\n')
+                    # Only the latest progress update of a long file matters
+                    if len(pending) > OUTPUT_READ_SIZE:
+                        pending = pending[pending.rfind(b'\r'):]
+                if pending:
+                    handle_line(pending)
+            process.wait()
+        finally:
+            watchdog.cancel()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            self.transfers.discard(process)
+            
+        if watchdog.reason:
+            log_file.write(f"\nWATCHDOG: {watchdog.reason}\n")
+            raise subprocess.TimeoutExpired(rsync_cmd, time.monotonic() - watchdog.started)
+        return process.returncode
+        
+    def _start_watchdog(self, processes: list, chunk_path: str) -> StallWatchdog:
+        """Watch a transfer for stalls and for overrunning its expected duration"""
+        watchdog_config = self.config.get('watchdog', {})
+        watchdog = StallWatchdog(
+            processes,
+            stall_timeout=watchdog_config.get('stall_timeout', 600),
+            deadline=lambda: self._chunk_deadline(chunk_path),
+            check_interval=watchdog_config.get('check_interval', 10)
+        )
+        watchdog.start()
+        return watchdog
+        
+    def _chunk_deadline(self, chunk_path: str) -> Optional[float]:
+        """Seconds a chunk may run, from its size and the throughput seen so far
+        
+        The expected duration is the chunk's bytes over the current rate
+        per active worker (never below min_rate), times a slack factor.
+        Chunks of unknown size only have the stall limit.
+        """
+        watchdog_config = self.config.get('watchdog', {})
+        expected = getattr(self, 'chunk_bytes', {}).get(chunk_path, 0)
+        slack = float(watchdog_config.get('deadline_slack', 3))
+        if not expected or not slack:
+            return None
+            
+        rate = self._measured_rate() or self.meter.rate()
+        per_worker = max(rate / max(1, self.worker_gate.active),
+                         parse_rate(watchdog_config.get('min_rate', '64KB/s')))
+        return watchdog_config.get('stall_timeout', 600) + slack * expected / per_worker
+        
+    def transfer_chunk(self, chunk_path: str, chunk_idx: int, retry_count: int = 0) -> Tuple[bool, str]:
+        """Transfer a chunk with the engine its file list was made for"""
+        if Path(chunk_path).name.startswith(f'{TAR_BATCH_PREFIX}_'):
+            return self.tar_chunk(chunk_path, chunk_idx, retry_count)
+        if Path(chunk_path).name.startswith(f'{RANGE_CHUNK_PREFIX}_'):
+            return self.range_chunk(chunk_path, chunk_idx, retry_count)
+        return self.rsync_chunk(chunk_path, chunk_idx, retry_count)
+        
+    def range_chunk(self, chunk_path: str, chunk_idx: int, retry_count: int = 0) -> Tuple[bool, str]:
+        """Fetch the single huge file of a range chunk with parallel byte ranges"""
+        log_path = Path(self.config.get('log_dir', 'logs')) / f'{Path(chunk_path).stem}.log'
+        
+        _, remaining = self.journal.pending_list(chunk_path)
+        if remaining == 0:
+            return True, str(log_path)
+        if self.stopped:
+            return False, f"Stopped: {log_path}"
+            
+        path = decode_path(next(iter_records(chunk_path)))
+        
+        remote_path = self.config['remote_root'].rstrip('/') + '/' + path
+        local_path = Path(self.destination) / path
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        link_dest = str(Path(self.link_dest) / path) if self.link_dest else None
+        
+        with open(log_path, 'a' if retry_count else 'w') as log_file:
+            log_file.write(f"Range transfer: {remote_path} -> {local_path}\n")
+            log_file.write(f"Started: {datetime.now()}\n")
+            log_file.flush()
+            
+            # One worker's share of the budget for all range streams together
+            with self.range_slots:
+                lease = self.governor.acquire(paced=True)
+                try:
+                    success, detail = RangeTransfer(self.ssh_manager, self.config, self.transfers).fetch(
+                        remote_path, str(local_path), slot=chunk_idx, log_file=log_file,
+                        link_dest=link_dest, lease=lease
+                    )
+                except OSError as e:
+                    success, detail = False, str(e)
+                finally:
+                    self.governor.release(lease)
+                    
+            log_file.write(f"\nFinished: {datetime.now()}\n")
+            log_file.write(f"Result: {detail}\n")
+            
+        if not success:
+            return False, f"{detail}: {log_path}"
             
+        with self.journal.open_writer(chunk_path) as journal:
+            journal.add(path)
+        if detail == 'fetched':
+            self.meter.add(local_path.stat().st_size)
+        return True, str(log_path)
+        
+    def tar_chunk(self, chunk_path: str, chunk_idx: int, retry_count: int = 0) -> Tuple[bool, str]:
+        """Stream a batch of files as one tar archive over SSH and extract it locally
+        
+        The file list is fed to the remote tar on stdin and the archive is
+        unpacked while it arrives, so there is no per-file round trip.
+        Extracted names (tar -v) feed the completion journal, so a retry
+        only asks for the files still missing. Files that vanish or cannot
+        be read are skipped by the remote tar and settled like rsync's.
+        """
+        log_path = Path(self.config.get('log_dir', 'logs')) / f'{Path(chunk_path).stem}.log'
+        
+        compression = self.config.get('tar_lane', {}).get('compression', 'none')
+        remote_cmd = (f"cd {shlex.quote(self.config['remote_root'])} && "
+                      f"tar -cf - --no-recursion --ignore-failed-read --quoting-style=escape --null -T -")
+        decompress_cmd = None
+        if compression and compression != 'none':
+            if compression not in STREAM_COMPRESSORS:
+                return False, f"Unsupported tar lane compression: {compression}"
+            remote_suffix, decompress_cmd = STREAM_COMPRESSORS[compression]
+            remote_cmd = f"{remote_cmd} | {remote_suffix}"
+            
+        # Multiplexed over the shared SSH master connections
+        ssh_cmd = self.ssh_manager.ssh_command(slot=chunk_idx) + [remote_cmd]
+        extract_cmd = ['tar', '-xpvf', '-', '--quoting-style=escape', '-C', self.destination]
+        
+        max_retries = self.config.get('retry_count', 3)
+        
+        for attempt in range(max_retries + 1):
+            settled = self._settled_files(chunk_path)
+            files_from, remaining = self.journal.pending_list(chunk_path, skip=settled)
+            if remaining == 0:
+                return self._settled_result(settled, log_path)
+            if self.stopped:
+                return False, f"Stopped: {log_path}"
+                
+            self.breaker.wait()
+            lease = self.governor.acquire(paced=True)
+            try:
+                with open(log_path, 'a' if attempt > 0 else 'w') as log_file:
+                    if attempt > 0:
+                        log_file.write(f"\n=== RETRY ATTEMPT {attempt}/{max_retries} ===\n")
+                    log_file.write(f"Command: {' '.join(ssh_cmd)} < {files_from} | {' '.join(extract_cmd)}\n")
+                    log_file.write(f"Started: {datetime.now()}\n")
+                    log_file.flush()
+                    
+                    file_errors = {}
+                    returncode = self._run_tar(ssh_cmd, decompress_cmd, extract_cmd, files_from,
+                                               chunk_path, log_file, lease, file_errors)
+                                               
+                    log_file.write(f"\nFinished: {datetime.now()}\n")
+                    log_file.write(f"Return code: {returncode}\n")
+                    
+                self.journal.record_errors(chunk_path, file_errors)
+                self.breaker.record(returncode not in CONNECTION_EXIT_CODES)
+                if returncode == 0:
+                    # tar -v names every extracted file: only failed ones are still pending
+                    settled = self._settled_files(chunk_path)
+                    _, remaining = self.journal.pending_list(chunk_path, skip=settled)
+                    if remaining == 0:
+                        return self._settled_result(settled, log_path)
+                        
+            except subprocess.TimeoutExpired:
+                # A stall says nothing about the link: a lost connection
+                # ends ssh with 255, which the breaker already counts
+                with open(log_path, 'a') as log_file:
+                    log_file.write(f"\nTIMEOUT at: {datetime.now()}\n")
+            except Exception as e:
+                with open(log_path, 'a') as log_file:
+                    log_file.write(f"\nERROR at: {datetime.now()}: {str(e)}\n")
+            finally:
+                self.governor.release(lease)
+                
+            if attempt < max_retries:
+                print(f"   Tar batch {chunk_idx+1}: ⚠️ Failed (attempt {attempt+1}), retrying...")
+                self._retry_pause(attempt)
+                
+        return False, f"Failed after {max_retries} retries: {log_path}"
+        
+    def _run_tar(self, ssh_cmd: List[str], decompress_cmd: Optional[List[str]],
+                 extract_cmd: List[str], files_from: str, chunk_path: str, log_file,
+                 lease: Optional[BandwidthLease] = None,
+                 file_errors: Optional[Dict[str, Tuple[str, str]]] = None) -> int:
+        """Run the remote tar | [decompress |] local tar pipeline
+        
+        The archive passes through this process on its way from ssh to the
+        local side, paced to the lease's share of the bandwidth budget.
+        Per-file errors of the remote tar are collected into file_errors.
+        Returns the first non-zero exit code of the pipeline, 0 on success;
+        the remote tar's "file changed as we read it" counts as success.
+        """
+        procs = []
+        with open(files_from, 'rb') as file_list:
+            procs.append(subprocess.Popen(ssh_cmd, stdin=file_list, stdout=subprocess.PIPE,
+                                          stderr=subprocess.PIPE))
+        stages = [decompress_cmd, extract_cmd] if decompress_cmd else [extract_cmd]
+        procs.append(subprocess.Popen(stages[0], stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE, stderr=log_file))
+        if decompress_cmd:
+            procs.append(subprocess.Popen(extract_cmd, stdin=procs[-1].stdout,
+                                          stdout=subprocess.PIPE, stderr=log_file))
+            # The extractor owns this pipe now
+            procs[-2].stdout.close()
+            
+        for proc in procs:
+            self.transfers.add(proc)
+        pump = threading.Thread(target=self._pump_archive,
+                                args=(procs[0].stdout, procs[1].stdin, lease), daemon=True)
+        pump.start()
+        
+        def read_remote_errors():
+            for raw_line in procs[0].stderr:
+                line = raw_line.decode('utf-8', errors='replace')
+                log_file.write(line)
+                log_file.flush()
+                error = parse_tar_error_line(decode_path(raw_line))
+                if error is not None and file_errors is not None:
+                    kind, path, reason = error
+                    file_errors[path] = (kind, reason)
+                    
+        stderr_reader = threading.Thread(target=read_remote_errors, daemon=True)
+        stderr_reader.start()
+        watchdog = self._start_watchdog(procs, chunk_path)
+        
+        try:
+            with self.journal.open_writer(chunk_path) as journal:
+                for raw_line in procs[-1].stdout:
+                    watchdog.progress()
+                    # Names are C-escaped, so a newline in a name cannot split it
+                    path = unescape_tar_name(raw_line.rstrip(b'\n'))
+                    if path and not path.endswith('/'):
+                        journal.add(path)
+                        self.meter.add(0)
+            for proc in procs:
+                proc.wait()
+        finally:
+            watchdog.cancel()
+            for proc in procs:
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+                self.transfers.discard(proc)
+            pump.join()
+            stderr_reader.join()
+            
+        if watchdog.reason:
+            log_file.write(f"\nWATCHDOG: {watchdog.reason}\n")
+            raise subprocess.TimeoutExpired(ssh_cmd, time.monotonic() - watchdog.started)
+        if procs[0].returncode == TAR_FILE_CHANGED:
+            return next((proc.returncode for proc in procs[1:] if proc.returncode), 0)
+        return next((proc.returncode for proc in procs if proc.returncode), 0)
+        
+    def _pump_archive(self, source, sink, lease: Optional[BandwidthLease]):
+        """Copy the archive stream from ssh to the extractor, paced to the lease"""
+        try:
+            while True:
+                block = source.read1(ARCHIVE_PUMP_BLOCK)
+                if not block:
+                    break
+                if lease is not None:
+                    lease.pace(len(block))
+                sink.write(block)
+        except (BrokenPipeError, ValueError):
+            # The extractor exited or was killed; its exit code tells why
+            pass
+        finally:
+            for stream in (sink, source):
+                try:
+                    stream.close()
+                except (BrokenPipeError, ValueError):
+                    pass
+                    
+                    
+    def _make_logger(self, log_file: Optional[str]):
+        """Build a function printing a message and appending it to the run log"""
+        def log_message(message: str):
+            print(message)
+            if log_file:
+                with open(log_file, 'a') as f:
+                    f.write(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}\n")
+                    f.flush()
+        return log_message
+        
+    def _start_services(self, use_monitoring: bool, log_message):
+        """Open SSH master connections and start bandwidth monitoring"""
+        # Open the shared SSH master connections
+        live_masters = self.ssh_manager.pool.start()
+        if self.ssh_manager.pool.enabled:
+            log_message(f"🔗 SSH connection pool: {live_masters}/{self.ssh_manager.pool.size} masters ready")
+            
+        # Start bandwidth monitoring
+        if use_monitoring and self.config.get('enable_bandwidth_monitoring', True):
+            self.start_bandwidth_monitoring()
+            
+        self.breaker.log = log_message
+        
+        # Time-of-day schedule sets budget and worker count while the run goes on
+        if self.schedule.enabled:
+            self._apply_schedule(log_message)
+            self._schedule_stop.clear()
+            self._schedule_thread = threading.Thread(
+                target=self._schedule_loop, args=(log_message,), daemon=True
+            )
+            self._schedule_thread.start()
+            
+        # Share bwlimit among the active workers
+        if self.governor.enabled or self.schedule.enabled:
+            self.governor.start()
+        if self.governor.enabled:
+            log_message(f"🚦 Bandwidth budget: {self._format_bytes(self.governor.total_bps)} "
+                        f"shared by all workers")
+                        
+        # Hill-climb the worker count on measured bytes/s and files/s
+        if self.tuner.enabled:
+            origin = 'best saved for this host' if self.tuner.resumed else 'initial'
+            log_message(f"🎛️  Autotune: starting at {self.tuner.workers} workers ({origin}), "
+                        f"range {self.tuner.min_workers}-{self.tuner.max_workers}")
+            self._autotune_stop.clear()
+            self._autotune_thread = threading.Thread(
+                target=self._autotune_loop, args=(log_message,), daemon=True
+            )
+            self._autotune_thread.start()
+            
+    def _stop_services(self):
+        """Stop bandwidth monitoring and close SSH master connections"""
+        if self._schedule_thread:
+            self._schedule_stop.set()
+            self._schedule_thread.join(timeout=5)
+            self._schedule_thread = None
+        if self._autotune_thread:
+            self._autotune_stop.set()
+            self._autotune_thread.join(timeout=5)
+            self._autotune_thread = None
+            self.tuner.save()
+        self.governor.stop()
+        if self.bandwidth_monitor:
+            self.stop_bandwidth_monitoring()
+        self.ssh_manager.pool.stop()
+        
+    def _apply_schedule(self, log_message):
+        """Switch budget and worker count when a new schedule window starts"""
+        window = self.schedule.current()
+        if window is self._schedule_window:
+            return
+            
+        self._schedule_window = window
+        self.governor.set_total(window['bwlimit'])
+        self._worker_ceiling = window['workers']
+        self._set_worker_limit()
+        
+        limit = self._format_bytes(window['bwlimit']) if window['bwlimit'] else 'unlimited'
+        log_message(f"🕘 Schedule {window['name']}: {limit}, {window['workers']} workers")
+        
+    def _schedule_loop(self, log_message):
+        """Re-check the schedule until the services stop"""
+        while not self._schedule_stop.wait(self.schedule.interval):
+            self._apply_schedule(log_message)
+            
+    def _autotune_loop(self, log_message):
+        """Feed the tuner one throughput sample per interval and apply its choice
+        
+        Bytes/s comes from the bandwidth monitor when it runs, otherwise
+        from the bytes rsync reports per finished file. Intervals where
+        fewer transfers ran than the gate allowed (listing still running,
+        tail of the run) say nothing about concurrency and are skipped.
+        """
+        last_bytes, last_files, last_time = self.meter.snapshot()
+        while not self._autotune_stop.wait(self.tuner.interval):
+            total_bytes, total_files, now = self.meter.snapshot()
+            elapsed = now - last_time
+            saturated = self.worker_gate.active >= self.worker_gate.limit
+            if saturated and elapsed > 0:
+                bytes_rate = self._measured_rate() or (total_bytes - last_bytes) / elapsed
+                files_rate = (total_files - last_files) / elapsed
+                previous = self.tuner.workers
+                workers = self.tuner.observe(bytes_rate, files_rate, ceiling=self._worker_ceiling)
+                if workers != previous:
+                    log_message(f"🎛️  Autotune: {previous} -> {workers} workers "
+                                f"({self._format_bytes(bytes_rate)}, {files_rate:.0f} files/s)")
+                    self._set_worker_limit()
+            last_bytes, last_files, last_time = total_bytes, total_files, now
+            
+    def _set_worker_limit(self):
+        """Let through the gate as many workers as the schedule and the tuner allow"""
+        limit = self._worker_ceiling
+        if self.tuner.enabled:
+            limit = min(limit, self.tuner.workers)
+        self.worker_gate.set_limit(limit)
+        
+    def _worker_threads(self, n_workers: int) -> int:
+        """Size the worker gate and return how many worker threads to start
+        
+        With a schedule the gate follows the current window and enough
+        threads exist for the busiest window; idle ones wait at the gate.
+        With autotune the tuner picks the count below that ceiling.
+        """
+        threads = n_workers
+        if self.schedule.enabled:
+            self._worker_ceiling = self.schedule.current()['workers']
+            threads = max(n_workers, self.schedule.max_workers())
+        elif self.tuner.enabled:
+            self._worker_ceiling = self.tuner.max_workers
+            threads = max(n_workers, self.tuner.max_workers)
+        else:
+            self._worker_ceiling = n_workers
+        self._set_worker_limit()
+        return threads
+        
+    def _gated_transfer(self, chunk_path: str, chunk_idx: int, retry_count: int = 0) -> Tuple[bool, str]:
+        """Transfer a chunk once the worker gate lets it through"""
+        with self.worker_gate:
+            if self.stopped:
+                return False, "Stopped before it started"
+            return self.transfer_chunk(chunk_path, chunk_idx, retry_count)
+            
+    def _retry_pause(self, attempt: int):
+        """Sleep the backoff delay before the next attempt, or until the run stops"""
+        self.transfers.stopped.wait(backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay))
+        
+    def _measured_rate(self) -> Optional[float]:
+        """Outgoing rate of the remote server (what we pull) from the monitor"""
+        if self.bandwidth_monitor and self.bandwidth_monitor.current_upload:
+            return self.bandwidth_monitor.current_upload
+        return None
+        
+    def _use_run_state(self, run_state: RunState):
+        """Point listing, chunk and journal files at a run directory"""
+        self.run_state = run_state
+        self.backup_type = run_state.backup_type
+        self.work_dir = run_state.run_dir
+        self.journal = CompletionJournal(run_state.run_dir / 'journal')
+        self.destination = run_state.data.get('destination', self.config['local_root'])
+        self.link_dest = run_state.data.get('link_dest')
+        
+    def _snapshot_enabled(self) -> bool:
+        """Check whether the current backup type writes versioned snapshots"""
+        snapshots = self.config.get('snapshots', {})
+        return bool(snapshots.get('enable', False)) and \
+            getattr(self, 'backup_type', 'full') in snapshots.get('types', ['longterm'])
+            
+    def _snapshots_dir(self) -> Path:
+        """Directory holding the snapshot versions"""
+        return Path(self.config['local_root']) / 'snapshots'
+        
+    def _latest_snapshot(self) -> Optional[Path]:
+        """Snapshot the 'latest' pointer refers to"""
+        latest = Path(self.config['local_root']) / 'latest'
+        if latest.is_symlink() and latest.resolve().is_dir():
+            return latest.resolve()
+        return None
+        
+    def _prepare_snapshot(self, log_message):
+        """Create this run's snapshot directory and pick its --link-dest"""
+        snapshot_dir = self._snapshots_dir() / self.run_state.run_id
+        snapshot_dir.mkdir(parents=True, exist_ok=True)
+        
+        previous = self._latest_snapshot()
+        self.destination = str(snapshot_dir)
+        self.link_dest = str(previous) if previous else None
+        self.run_state.update(destination=self.destination, link_dest=self.link_dest)
+        
+        log_message(f"📸 Snapshot: {snapshot_dir}")
+        if previous:
+            log_message(f"   Hard-linking unchanged files against {previous.name}")
+            
+    def _link_unchanged_files(self, partial: bool, log_message):
+        """Hard-link files the manifest reports unchanged from the previous snapshot
+        
+        Incremental runs only hand changed files to rsync, so --link-dest
+        never sees the unchanged ones. They are linked locally instead, which
+        costs no remote I/O and no extra space.
+        """
+        if not self.link_dest:
+            return
+            
+        previous = Path(self.link_dest)
+        destination = Path(self.destination)
+        linked = 0
+        last_parent = None
+        
+        for path in self.manifest.iter_unchanged(partial=partial):
+            target = destination / path
+            parent = target.parent
+            if parent != last_parent:
+                parent.mkdir(parents=True, exist_ok=True)
+                last_parent = parent
+            try:
+                os.link(previous / path, target)
+                linked += 1
+            except FileExistsError:
+                pass
+            except FileNotFoundError:
+                # Missing from the previous snapshot: fetch it again
+                continue
+                
+        log_message(f"🔗 Hard-linked {linked:,} unchanged files from previous snapshot")
+        
+    def _update_latest_snapshot(self):
+        """Mark this run's snapshot complete and atomically point 'latest' at it"""
+        (Path(self.destination) / COMPLETE_MARKER).touch()
+        
+        latest = Path(self.config['local_root']) / 'latest'
+        tmp_link = latest.with_name('.latest.tmp')
+        if tmp_link.is_symlink() or tmp_link.exists():
+            tmp_link.unlink()
+        os.symlink(os.path.relpath(self.destination, latest.parent), tmp_link)
+        os.replace(tmp_link, latest)
+        
     def run_backup(self, backup_type: str = 'full', use_monitoring: bool = True, log_file: str = None) -> Dict[str, Any]:
         """Run the main backup process"""
         self.backup_type = backup_type  # Store for timeout logic
@@ -199,132 +1309,545 @@ class BackupEngine:
         print("=" * 80)
         
         # Enhanced logging
-        def log_message(message: str):
-            print(message)
-            if log_file:
-                with open(log_file, 'a') as f:
-                    f.write(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}\n")
-                    f.flush()
+        log_message = self._make_logger(log_file)
         
-        # Start bandwidth monitoring
-        if use_monitoring and self.config.get('enable_bandwidth_monitoring', True):
-            self.start_bandwidth_monitoring()
+        # Persistent run state so an interrupted run can be resumed
+        state_dir = self.config.get('state_dir', 'state')
+        RunState.cleanup(state_dir, keep=self.config.get('keep_runs', 5))
+        # A new run supersedes unfinished runs of its own type only
+        for stale in RunState.incomplete_runs(state_dir):
+            if stale.backup_type == backup_type:
+                stale.update(status='abandoned')
+            else:
+                log_message(f"⏸️  Keeping resumable {stale.backup_type} run {stale.run_id}")
+        self._use_run_state(RunState.create(state_dir, backup_type))
+        log_message(f"💾 Run state: {self.run_state.run_dir}")
+        
+        if self._snapshot_enabled():
+            self._prepare_snapshot(log_message)
             
+        self._start_services(use_monitoring, log_message)
+        
         try:
+            # Server-side change detection for incremental runs
+            incremental = self._incremental_enabled()
+            since = self._changes_since() if incremental else None
+            listing_started = self._remote_time() if incremental else None
+            
+            scheduling_mode = self.config.get('scheduling', {}).get('mode', 'static')
+            budget = parse_size(self._backup_type_config().get('max_size'))
+            
+            # Pipeline: transfers start while the remote listing is still running
+            if scheduling_mode == 'pipeline':
+                if incremental or budget:
+                    log_message("⚠️  Incremental and max_size runs need the full listing, "
+                                "using dynamic scheduling")
+                    scheduling_mode = 'dynamic'
+                else:
+                    results = self._run_pipeline(since, log_message)
+                    return self._finish_run(results, start_time, log_message)
+                    
             # Build file list
-            log_message("📋 Building file list from remote server...")
-            all_files = self.build_file_list()
+            if since is not None:
+                log_message("📋 Building list of changed files from remote server...")
+            else:
+                log_message("📋 Building file list from remote server...")
+            all_files = self.build_file_list(since=since)
             
             # Count total files
-            with open(all_files) as f:
-                total_files = sum(1 for line in f if line.strip())
+            total_files = self._count_records(all_files)
             log_message(f"� Found {total_files:,} files to process")
             
-            # Chunk files
-            log_message("�🔀 Creating file chunks for parallel processing...")
-            chunks = self.chunk_file_list(all_files)
-            log_message(f"📦 Created {len(chunks)} chunks for processing")
-            
-            # Execute rsync in parallel
-            log_message(f"🔄 Starting rsync with {len(chunks)} chunks...")
-            results = {}
-            
-            with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
-                futures = {
-                    executor.submit(self.rsync_chunk, chunks[i], i): i 
-                    for i in range(len(chunks))
-                }
-                
-                completed = 0
-                for future in as_completed(futures):
-                    chunk_idx = futures[future]
-                    success, log_info = future.result()
-                    results[chunk_idx] = {
-                        'success': success,
-                        'log': log_info
-                    }
+            # Incremental: keep only files changed since the last successful run
+            if incremental:
+                all_files = self.filter_changed_files(all_files)
+                changed_files = self._count_records(all_files)
+                log_message(f"🔍 Incremental: {changed_files:,} of {total_files:,} files new or changed")
+                if self._snapshot_enabled():
+                    self._link_unchanged_files(since is not None, log_message)
                     
-                    completed += 1
-                    status = "✅ OK" if success else "❌ FAILED"
-                    progress_msg = f"Chunk {chunk_idx+1}: {status} [{completed}/{len(chunks)}]"
-                    log_message(progress_msg)
+            # Enforce the max_size budget of the backup type (e.g. quick)
+            budget_trimmed = False
+            if budget:
+                listed = self._count_records(all_files)
+                all_files = self.select_within_budget(all_files, budget)
+                selected = self._count_records(all_files)
+                budget_trimmed = selected < listed
+                log_message(f"🎯 Selected {selected:,} files within {self._format_size(budget)} budget "
+                            f"({self._backup_type_config().get('selection', 'recent')} first)")
+                # Files left out must still look new to the next run
+                if incremental and budget_trimmed:
+                    self.manifest.stage_listing(iter_listing(all_files, self.config['remote_root']))
                     
-            # Retry failed chunks with more aggressive retry
-            failed_chunks = [idx for idx, result in results.items() if not result['success']]
+            # Huge files are fetched as parallel byte ranges instead of one rsync stream
+            range_chunks = []
+            if self.config.get('large_files', {}).get('enable', False):
+                all_files, range_chunks = self.split_large_files(all_files)
+                if range_chunks:
+                    log_message(f"🧩 {len(range_chunks)} huge files "
+                                f"({self._format_size(sum(self.range_bytes.values()))}) "
+                                f"go through the parallel range engine")
+                                
+            # Small files and crowded directories go as tar streams on first backups
+            tar_batches = []
+            if self._use_tar_lane(since):
+                all_files, tar_batches = self.split_tar_lane(all_files)
+                log_message(f"📦 Tar lane: {len(tar_batches)} batches, "
+                            f"{self._format_size(sum(self.tar_bytes.values()))} of small files")
+                            
+            # Chunk files
+            if scheduling_mode == 'dynamic':
+                # Many small batches pulled from a shared queue by `threads` workers
+                log_message("🔀 Splitting file list into batches for dynamic scheduling...")
+                chunks = self.batch_file_list(all_files)
+                n_workers = min(self.config.get('threads', 4), len(chunks)) or 1
+                log_message(f"📦 Created {len(chunks)} batches for {n_workers} workers")
+            else:
+                log_message("�🔀 Creating file chunks for parallel processing...")
+                chunks = self.chunk_file_list(all_files)
+                n_workers = len(chunks)
+                log_message(f"📦 Created {len(chunks)} chunks for processing")
+                
+            if tar_batches:
+                chunks += tar_batches
+                self.chunk_bytes.update(self.tar_bytes)
+                
+            # Longest jobs first; each runs its own pool of range streams
+            if range_chunks:
+                chunks = range_chunks + chunks
+                self.chunk_bytes.update(self.range_bytes)
+                n_workers += min(len(range_chunks), self.range_concurrency)
+                
+            self.run_state.save_plan(
+                chunks, self.chunk_bytes, n_workers,
+                incremental=incremental,
+                since=since,
+                listing_started=listing_started,
+                budget_trimmed=budget_trimmed
+            )
+            
+            results = self._execute_chunks(chunks, list(range(len(chunks))), n_workers, log_message)
+            return self._finish_run(results, start_time, log_message)
+            
+        finally:
+            self._stop_services()
             
-            if failed_chunks:
-                log_message(f"\n🔄 Retrying {len(failed_chunks)} failed chunks...")
+    def _run_pipeline(self, since: Optional[int], log_message) -> Dict[int, Dict[str, Any]]:
+        """Transfer batches while the remote listing is still being produced
+        
+        A producer thread streams the find output into the listing file, the
+        batcher follows that file and hands every closed batch to a bounded
+        queue, and `threads` workers pull from the queue. When the queue is
+        full the batcher blocks instead of reading ahead, so memory stays
+        bounded while the listing keeps growing on disk. Huge files and
+        small files are routed to the range engine and the tar lane by size
+        as they are listed.
+        
+        The plan is saved up front and every batch is added to it as it is
+        emitted, so an interrupted run stays resumable at any point.
+        """
+        scheduling = self.config.get('scheduling', {})
+        max_files = int(scheduling.get('batch_files', 5000))
+        max_bytes = parse_size(scheduling.get('batch_bytes', '1GB'))
+        n_workers = self.config.get('threads', 4)
+        batch_queue = queue.Queue(maxsize=int(scheduling.get('queue_depth', n_workers * 2)))
+        n_threads = self._worker_threads(n_workers)
+        
+        large_threshold = 0
+        if self.config.get('large_files', {}).get('enable', False):
+            large_threshold = parse_size(self.config['large_files'].get('threshold', '50GB'))
+        tar_threshold = 0
+        if self._use_tar_lane(since):
+            tar_threshold = parse_size(self.config['tar_lane'].get('small_file_threshold', '64KB'))
+            
+        for name in ('batches', 'tar', 'ranges'):
+            shutil.rmtree(self.work_dir / name, ignore_errors=True)
+            (self.work_dir / name).mkdir(parents=True)
+        batches = BatchWriter(self.work_dir / 'batches', 'batch', max_files, max_bytes,
+                              buffering=CHUNK_WRITE_BUFFER)
+        tar_batches = BatchWriter(self.work_dir / 'tar', TAR_BATCH_PREFIX,
+                                  int(self.config.get('tar_lane', {}).get('batch_files', 20000)),
+                                  parse_size(self.config.get('tar_lane', {}).get('batch_bytes', '1GB')),
+                                  buffering=CHUNK_WRITE_BUFFER)
+                                  
+        # Producer: remote find streamed into the listing file
+        listing = self.work_dir / 'all_files.txt'
+        listing.touch()
+        listing_done = threading.Event()
+        listing_errors = []
+        
+        def produce():
+            try:
+                self.build_file_list(since=since)
+            except Exception as e:
+                listing_errors.append(e)
+            finally:
+                listing_done.set()
                 
-                # Multiple retry rounds for persistent failures
-                max_retry_rounds = 3
-                for retry_round in range(max_retry_rounds):
-                    if not failed_chunks:
-                        break
-                        
-                    log_message(f"🔄 Retry round {retry_round + 1}/{max_retry_rounds}")
-                    
-                    current_failed = failed_chunks.copy()
-                    failed_chunks = []
+        # Consumers: transfer workers pulling batches from the queue
+        chunks = []
+        results = {}
+        results_lock = threading.Lock()
+        
+        def transfer_worker():
+            while True:
+                item = batch_queue.get()
+                if item is None:
+                    return
+                chunk_idx, chunk_path = item
+                try:
+                    success, log_info = self._gated_transfer(chunk_path, chunk_idx)
+                except Exception as e:
+                    success, log_info = False, f"Error: {e}"
+                with results_lock:
+                    results[chunk_idx] = {'success': success, 'log': log_info}
+                    self.run_state.mark_chunk(chunk_path, success)
                     
-                    for idx in current_failed:
-                        success, log_info = self.rsync_chunk(chunks[idx], idx, retry_count=retry_round)
-                        results[idx] = {
-                            'success': success,
-                            'log': log_info
-                        }
-                        
-                        status = "✅ OK" if success else "❌ FAILED"
-                        log_message(f"Chunk {idx+1} retry: {status}")
-                        
-                        if not success:
-                            failed_chunks.append(idx)
+                status = "✅ OK" if success else "❌ FAILED"
+                log_message(f"Chunk {chunk_idx+1}: {status} [{len(results)} done, "
+                            f"{batch_queue.qsize()} queued]")
                             
-                    # Wait between retry rounds
-                    if failed_chunks and retry_round < max_retry_rounds - 1:
-                        import time
-                        log_message("⏳ Waiting 30 seconds before next retry round...")
-                        time.sleep(30)
+        def emit(chunk_path: Optional[str], size: int):
+            if chunk_path is None:
+                return
+            chunks.append(chunk_path)
+            self.chunk_bytes[chunk_path] = size
+            self.run_state.add_chunk(chunk_path, size)
+            # Blocks while the queue is full: backpressure on the batcher
+            batch_queue.put((len(chunks) - 1, chunk_path))
+            
+        self.chunk_bytes = {}
+        self.run_state.reset_chunks()
+        self.run_state.save_plan(
+            [], {}, n_workers,
+            incremental=False,
+            since=since,
+            listing_started=None,
+            listing_complete=False
+        )
+        producer = threading.Thread(target=produce, daemon=True)
+        workers = [threading.Thread(target=transfer_worker, daemon=True) for _ in range(n_threads)]
+        producer.start()
+        for worker in workers:
+            worker.start()
+            
+        log_message(f"🔀 Pipeline: listing and transferring with {n_workers} workers...")
+        n_files = n_ranges = 0
+        
+        try:
+            for entry in follow_listing(str(listing), self.config['remote_root'], listing_done):
+                if self.stopped:
+                    break
+                n_files += 1
+                if large_threshold and entry.size >= large_threshold:
+                    n_ranges += 1
+                    emit(self._write_range_chunk(self.work_dir / 'ranges', entry.path, n_ranges), entry.size)
+                elif tar_threshold and entry.size < tar_threshold:
+                    closed = tar_batches.add(entry)
+                    emit(closed, tar_batches.batch_bytes.get(closed, 0))
+                else:
+                    closed = batches.add(entry)
+                    emit(closed, batches.batch_bytes.get(closed, 0))
                     
-            # Calculate results
-            success_count = sum(1 for result in results.values() if result['success'])
-            total_count = len(results)
-            
-            end_time = datetime.now()
-            duration = end_time - start_time
-            
-            backup_result = {
-                'success': success_count == total_count,
-                'total_chunks': total_count,
-                'successful_chunks': success_count,
-                'failed_chunks': total_count - success_count,
-                'start_time': start_time,
-                'end_time': end_time,
-                'duration': duration,
-                'backup_type': backup_type,
-                'chunk_logs': results
+            for writer in (batches, tar_batches):
+                closed = writer.close()
+                emit(closed, writer.batch_bytes.get(closed, 0))
+                
+            if not listing_errors:
+                log_message(f"📦 Listed {n_files:,} files into {len(chunks)} batches")
+                self.run_state.update_plan(listing_complete=True)
+        finally:
+            if self.stopped:
+                # Queued batches stay pending in the plan for a resume
+                while not batch_queue.empty():
+                    batch_queue.get_nowait()
+            for _ in workers:
+                batch_queue.put(None)
+            for worker in workers:
+                worker.join()
+            # A stopped run leaves the remote find to the daemon producer
+            if not self.stopped:
+                producer.join()
+                
+        if listing_errors:
+            raise listing_errors[0]
+            
+        return self._retry_failed_chunks(chunks, results, log_message)
+        
+    def resume_backup(self, use_monitoring: bool = True, log_file: str = None) -> Dict[str, Any]:
+        """Continue the most recent interrupted or failed run
+        
+        Chunks recorded as done are skipped, and the remaining chunks only
+        transfer the files that are not in the completion journal yet.
+        """
+        state_dir = self.config.get('state_dir', 'state')
+        run_state = RunState.latest_incomplete(state_dir)
+        if run_state is None:
+            raise RuntimeError("No interrupted backup run to resume")
+            
+        if not run_state.plan:
+            # Interrupted while listing: nothing reusable, start over
+            print(f"⚠️  Run {run_state.run_id} has no chunk plan yet, starting a new {run_state.backup_type} backup")
+            run_state.update(status='abandoned')
+            return self.run_backup(run_state.backup_type, use_monitoring, log_file)
+            
+        start_time = datetime.now()
+        self._use_run_state(run_state)
+        run_state.update(status='running')
+        log_message = self._make_logger(log_file)
+        
+        if run_state.plan.get('listing_complete') is False:
+            return self._resume_pipeline(run_state, start_time, use_monitoring, log_message)
+            
+        chunks = run_state.chunk_paths()
+        self.chunk_bytes = run_state.chunk_bytes()
+        done = run_state.chunk_results()
+        pending = [idx for idx, chunk in enumerate(chunks) if not done.get(chunk)]
+        
+        print(f"♻️  Resuming {run_state.backup_type} backup from run {run_state.run_id}")
+        log_message(f"📦 {len(chunks) - len(pending)}/{len(chunks)} chunks already done, {len(pending)} pending")
+        print("=" * 80)
+        
+        self._start_services(use_monitoring, log_message)
+        
+        try:
+            results = {
+                idx: {'success': True, 'log': 'completed in an earlier session'}
+                for idx in range(len(chunks)) if idx not in pending
             }
+            n_workers = min(run_state.plan.get('n_workers', self.config.get('threads', 4)), len(pending)) or 1
+            results.update(self._execute_chunks(chunks, pending, n_workers, log_message))
+            return self._finish_run(results, start_time, log_message)
             
-            # Print summary
-            print("=" * 80)
-            if backup_result['success']:
-                print(f"✅ Backup completed successfully!")
-            else:
-                print(f"⚠️  Backup completed with errors!")
+        finally:
+            self._stop_services()
+            
+    def _resume_pipeline(self, run_state: RunState, start_time: datetime, use_monitoring: bool,
+                         log_message) -> Dict[str, Any]:
+        """Continue a pipeline run that was interrupted before its listing ended
+        
+        The files not listed yet are only known after a new listing, so the
+        pipeline runs again into the same destination. Files the earlier
+        session finished are unchanged there and rsync skips them with its
+        quick check; a file in flight continues from rsync's partial dir.
+        """
+        print(f"♻️  Resuming {run_state.backup_type} backup from run {run_state.run_id}")
+        log_message(f"📋 Listing was interrupted after {len(run_state.chunk_paths())} batches, "
+                    f"listing again into the same destination")
+        print("=" * 80)
+        
+        shutil.rmtree(self.work_dir / 'journal', ignore_errors=True)
+        self.journal = CompletionJournal(self.work_dir / 'journal')
+        self._start_services(use_monitoring, log_message)
+        
+        try:
+            results = self._run_pipeline(run_state.plan.get('since'), log_message)
+            return self._finish_run(results, start_time, log_message)
+        finally:
+            self._stop_services()
+            
+    def _execute_chunks(self, chunks: List[str], indices: List[int], n_workers: int,
+                        log_message) -> Dict[int, Dict[str, Any]]:
+        """Rsync the given chunks in parallel, then retry failed ones"""
+        # Execute rsync in parallel
+        log_message(f"🔄 Starting rsync with {len(indices)} chunks...")
+        results = {}
+        
+        executor = ThreadPoolExecutor(max_workers=self._worker_threads(n_workers))
+        try:
+            futures = {
+                executor.submit(self._gated_transfer, chunks[i], i): i 
+                for i in indices
+            }
+            
+            completed = 0
+            for future in as_completed(futures):
+                chunk_idx = futures[future]
+                success, log_info = future.result()
+                results[chunk_idx] = {
+                    'success': success,
+                    'log': log_info
+                }
+                self.run_state.mark_chunk(chunks[chunk_idx], success)
                 
-            print(f"📊 Results: {success_count}/{total_count} chunks successful")
-            print(f"⏱️  Duration: {duration}")
+                completed += 1
+                status = "✅ OK" if success else "❌ FAILED"
+                progress_msg = f"Chunk {chunk_idx+1}: {status} [{completed}/{len(indices)}]"
+                log_message(progress_msg)
+        finally:
+            # On a stop, queued chunks never start
+            executor.shutdown(wait=True, cancel_futures=True)
             
-            if self.bandwidth_monitor:
-                print(f"📡 Max bandwidth observed: "
-                     f"⬇️ {self._format_bytes(self.bandwidth_monitor.max_download)} | "
-                     f"⬆️ {self._format_bytes(self.bandwidth_monitor.max_upload)}")
-                     
-            return backup_result
+        return self._retry_failed_chunks(chunks, results, log_message)
+        
+    def _retry_failed_chunks(self, chunks: List[str], results: Dict[int, Dict[str, Any]],
+                             log_message) -> Dict[int, Dict[str, Any]]:
+        """Push the failed chunks of a first pass back into the worker pool
+        
+        Each failed chunk gets up to retry.rounds more passes. A pass is
+        scheduled after its own exponential backoff with jitter and then
+        runs in parallel with the others through the worker gate. While
+        the circuit breaker is open the passes wait instead of failing.
+        """
+        failed_chunks = [idx for idx, result in results.items() if not result['success']]
+        if not failed_chunks:
+            return results
+            
+        max_retry_rounds = int(self.config.get('retry', {}).get('rounds', 3))
+        log_message(f"\n🔄 Retrying {len(failed_chunks)} failed chunks in parallel "
+                    f"(up to {max_retry_rounds} passes each)...")
+        self.ssh_manager.pool.health_check()
+        
+        def retry(idx: int, retry_round: int) -> Tuple[bool, str]:
+            self.breaker.wait()
+            return self._gated_transfer(chunks[idx], idx, retry_count=retry_round + 1)
             
+        # (due time, chunk index, retry round) of the passes not started yet
+        due = [(time.monotonic() + backoff_delay(0, self.retry_base_delay, self.retry_max_delay), idx, 0)
+               for idx in failed_chunks]
+        heapq.heapify(due)
+        running = {}
+        n_threads = self._worker_threads(min(len(failed_chunks), self.config.get('threads', 4)))
+        
+        executor = ThreadPoolExecutor(max_workers=n_threads)
+        try:
+            while (due or running) and not self.stopped:
+                now = time.monotonic()
+                while due and due[0][0] <= now:
+                    _, idx, retry_round = heapq.heappop(due)
+                    running[executor.submit(retry, idx, retry_round)] = (idx, retry_round)
+                    
+                timeout = max(0.0, due[0][0] - now) if due else None
+                if not running:
+                    self.transfers.stopped.wait(timeout)
+                    continue
+                    
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    idx, retry_round = running.pop(future)
+                    try:
+                        success, log_info = future.result()
+                    except Exception as e:
+                        success, log_info = False, f"Error: {e}"
+                    results[idx] = {
+                        'success': success,
+                        'log': log_info
+                    }
+                    self.run_state.mark_chunk(chunks[idx], success)
+                    
+                    status = "✅ OK" if success else "❌ FAILED"
+                    log_message(f"Chunk {idx+1} retry {retry_round + 1}/{max_retry_rounds}: {status}")
+                    
+                    if not success and retry_round + 1 < max_retry_rounds:
+                        delay = backoff_delay(retry_round + 1, self.retry_base_delay, self.retry_max_delay)
+                        heapq.heappush(due, (time.monotonic() + delay, idx, retry_round + 1))
         finally:
-            if self.bandwidth_monitor:
-                self.stop_bandwidth_monitoring()
-                
+            executor.shutdown(wait=True, cancel_futures=True)
+            
+        return results
+        
+    def _finish_run(self, results: Dict[int, Dict[str, Any]], start_time: datetime,
+                    log_message) -> Dict[str, Any]:
+        """Record the outcome of a run and print its summary"""
+        backup_type = self.backup_type
+        plan = self.run_state.plan
+        
+        # Calculate results
+        success_count = sum(1 for result in results.values() if result['success'])
+        total_count = len(results)
+        
+        end_time = datetime.now()
+        duration = end_time - start_time
+        
+        # Only a fully successful run becomes the new incremental baseline.
+        # A run trimmed by max_size only adds the files it sent, and keeps the
+        # remote time of the last run, so the skipped files are listed again.
+        if plan.get('incremental') and success_count == total_count:
+            since = plan.get('since')
+            listing_started = plan.get('listing_started')
+            trimmed = plan.get('budget_trimmed', False)
+            self.open_manifest().commit(backup_type, end_time.isoformat(),
+                                        partial=since is not None or trimmed)
+            if listing_started is not None and not trimmed:
+                self.manifest.set_meta('last_run_remote_time', listing_started)
+                if since is None:
+                    self.manifest.set_meta('last_full_scan_remote_time', listing_started)
+            log_message("🗂️  Manifest updated for next incremental run")
+            
+        self.run_state.update(
+            status='completed' if success_count == total_count else 'failed',
+            finished=end_time.isoformat()
+        )
+        
+        file_errors = self._write_failure_manifest(log_message)
+        
+        # Only a complete snapshot becomes 'latest'
+        if self.destination != self.config['local_root'] and success_count == total_count:
+            self._update_latest_snapshot()
+            log_message(f"📸 latest -> {Path(self.destination).name}")
+            
+        backup_result = {
+            'success': success_count == total_count,
+            'total_chunks': total_count,
+            'successful_chunks': success_count,
+            'failed_chunks': total_count - success_count,
+            'start_time': start_time,
+            'end_time': end_time,
+            'duration': duration,
+            'backup_type': backup_type,
+            'chunk_logs': results,
+            'file_errors': file_errors
+        }
+        
+        # Print summary
+        print("=" * 80)
+        if backup_result['success']:
+            print(f"✅ Backup completed successfully!")
+        else:
+            print(f"⚠️  Backup completed with errors!")
+            
+        print(f"📊 Results: {success_count}/{total_count} chunks successful")
+        print(f"⏱️  Duration: {duration}")
+        
+        if self.tuner.enabled and self.tuner.best:
+            print(f"🎛️  Best worker count: {self.tuner.best[0]} (saved for the next run)")
+            
+        if self.bandwidth_monitor:
+            print(f"📡 Max bandwidth observed: "
+                 f"⬇️ {self._format_bytes(self.bandwidth_monitor.max_download)} | "
+                 f"⬆️ {self._format_bytes(self.bandwidth_monitor.max_upload)}")
+                 
+        return backup_result
+        
+    def _write_failure_manifest(self, log_message) -> Dict[str, int]:
+        """Write the files that still have errors to one compact list per run
+        
+        One line per file: kind, path and rsync's reason, tab-separated,
+        with tabs, newlines and backslashes in paths escaped. Files that
+        succeeded on a later attempt are left out. Returns the count per
+        kind.
+        """
+        counts = {}
+        manifest_path = self.work_dir / 'failures.tsv'
+        with open(manifest_path, 'w', encoding='utf-8', errors='surrogateescape') as f:
+            for chunk_path in self.run_state.chunk_paths():
+                errors = self.journal.file_errors(chunk_path)
+                if not errors:
+                    continue
+                done = self.journal.completed(chunk_path)
+                for path, (kind, reason) in sorted(errors.items()):
+                    if encode_path(path) not in done:
+                        f.write(f"{kind}\t{_escape_field(path)}\t{reason}\n")
+                        counts[kind] = counts.get(kind, 0) + 1
+                        
+        if not counts:
+            manifest_path.unlink()
+            return counts
+            
+        summary = ', '.join(f"{count} {kind}" for kind, count in sorted(counts.items()))
+        log_message(f"🧾 File errors: {summary} -> {manifest_path}")
+        return counts
+        
     def start_bandwidth_monitoring(self, interval: int = None):
         """Start bandwidth monitoring in background"""
         if interval is None:
@@ -332,7 +1855,8 @@ class BackupEngine:
             
         self.bandwidth_monitor = BandwidthMonitor(
             self.network_monitor, 
-            interval=interval
+            interval=interval,
+            sample_interval=self.config.get('monitoring_sample_interval', 1)
         )
         self.bandwidth_monitor.start()
         
@@ -350,14 +1874,26 @@ class BackupEngine:
             bytes_val /= 1024.0
         return f"{bytes_val:.1f} TB/s"
 
+    def _format_size(self, bytes_val: float) -> str:
+        """Format a size in bytes to human readable format"""
+        for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
+            if bytes_val < 1024.0:
+                return f"{bytes_val:.1f} {unit}"
+            bytes_val /= 1024.0
+        return f"{bytes_val:.1f} PB"
+
 class BandwidthMonitor:
     """Background bandwidth monitoring thread"""
     
-    def __init__(self, network_monitor: NetworkInterfaceMonitor, interval: int = 10):
+    def __init__(self, network_monitor: NetworkInterfaceMonitor, interval: int = 10,
+                 sample_interval: float = 1.0):
         self.network_monitor = network_monitor
         self.interval = interval
+        self.sample_interval = sample_interval
         self.running = False
         self.thread = None
+        self.stream = None
+        self._baseline = None
         self.max_download = 0
         self.max_upload = 0
         self.current_download = 0
@@ -369,6 +1905,8 @@ class BandwidthMonitor:
             return
             
         self.running = True
+        self.stream = self.network_monitor.open_stream(self.sample_interval)
+        self.stream.start()
         self.thread = threading.Thread(target=self._monitor_loop, daemon=True)
         self.thread.start()
         print(f"🔍 Bandwidth monitoring started (interval: {self.interval}s)")
@@ -376,17 +1914,48 @@ class BandwidthMonitor:
     def stop(self):
         """Stop monitoring thread"""
         self.running = False
+        if self.stream:
+            self.stream.stop()
         if self.thread:
             self.thread.join(timeout=5)
         print(f"\n📊 Max bandwidth observed: "
              f"⬇️ {self._format_bytes(self.max_download)} | "
              f"⬆️ {self._format_bytes(self.max_upload)}")
              
+    def _read_bandwidth(self) -> Optional[Dict[str, Any]]:
+        """Aggregate the snapshots streamed since the last call into rates
+        
+        The window rate is exact over the whole interval (first to last
+        snapshot on the remote clock) and the peak is taken from every pair
+        of consecutive snapshots.
+        """
+        if not self.stream.is_alive():
+            # Remote loop died (network drop, reboot): start a new one
+            self.stream.start()
+            
+        samples = self.stream.drain()
+        if not samples:
+            return None
+            
+        points = ([self._baseline] if self._baseline else []) + samples
+        self._baseline = samples[-1]
+        if len(points) < 2:
+            return None
+            
+        for (t1, stats1), (t2, stats2) in zip(points, points[1:]):
+            rates = self.network_monitor.compute_bandwidth(stats1, stats2, t2 - t1)
+            if rates:
+                self.max_download = max(self.max_download, rates['total_download_bps'])
+                self.max_upload = max(self.max_upload, rates['total_upload_bps'])
+                
+        (start_time, first), (end_time, last) = points[0], points[-1]
+        return self.network_monitor.compute_bandwidth(first, last, end_time - start_time)
+        
     def _monitor_loop(self):
         """Main monitoring loop"""
         while self.running:
             try:
-                bandwidth = self.network_monitor.get_bandwidth_usage()
+                bandwidth = self._read_bandwidth()
                 
                 if bandwidth:
                     self.current_download = bandwidth['total_download_bps']
@@ -12,6 +12,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from src.core.config import ConfigManager
 from src.core.backup import BackupEngine
+from src.core.retention import SnapshotPruner
 from src.utils.formatting import (
     print_logo, print_header, print_success, print_error, 
     format_duration, Colors
@@ -34,10 +35,23 @@ class BackupRunner:
         """Handle interruption signals"""
         print(f"\n⚠️  Received signal {signum}. Stopping backup gracefully...")
         self.interrupted = True
-        
+
+        # Kill running transfers so the executors wind down right away
+        if self.backup_engine:
+            self.backup_engine.stop()
+
         if self.backup_engine and self.backup_engine.bandwidth_monitor:
             self.backup_engine.stop_bandwidth_monitoring()
             
+        # Keep the run resumable with: python -m src.core.backup_runner resume
+        if self.backup_engine and self.backup_engine.run_state:
+            self.backup_engine.run_state.update(status='interrupted')
+            raise KeyboardInterrupt
+            
+        # A prune picks up its claimed snapshots again on the next run
+        if self.backup_type == 'prune':
+            raise KeyboardInterrupt
+            
     def _get_backup_config(self) -> dict:
         """Get configuration for specific backup type"""
         config = self.config_manager.config
@@ -52,6 +66,12 @@ class BackupRunner:
             if 'max_size' in backup_config and backup_config['max_size'] != 'unlimited':
                 print(f"   Max size: {backup_config['max_size']}")
                 
+            if backup_config.get('exclude_patterns'):
+                print(f"   Exclude: {', '.join(backup_config['exclude_patterns'])}")
+                
+            if backup_config.get('include_patterns'):
+                print(f"   Include: {', '.join(backup_config['include_patterns'])}")
+                
             if backup_config.get('enable_compression'):
                 print("   Compression: Enabled")
                 
@@ -115,12 +135,18 @@ class BackupRunner:
                 return False
             
             # Run backup with enhanced error handling
-            result = self.backup_engine.run_backup(
-                backup_type=self.backup_type,
-                use_monitoring=True,
-                log_file=str(log_file)
-            )
-            
+            if self.backup_type == 'resume':
+                result = self.backup_engine.resume_backup(
+                    use_monitoring=True,
+                    log_file=str(log_file)
+                )
+            else:
+                result = self.backup_engine.run_backup(
+                    backup_type=self.backup_type,
+                    use_monitoring=True,
+                    log_file=str(log_file)
+                )
+                
             # Print results
             print("\n" + "=" * 80)
             print("📊 BACKUP RESULTS")
@@ -135,6 +161,8 @@ class BackupRunner:
             print(f"   Total chunks: {result['total_chunks']}")
             print(f"   Successful: {result['successful_chunks']}")
             print(f"   Failed: {result['failed_chunks']}")
+            if result.get('file_errors'):
+                print(f"   File errors: {', '.join(f'{n} {kind}' for kind, n in sorted(result['file_errors'].items()))}")
             print(f"   Duration: {format_duration(result['duration'])}")
             print(f"   Started: {result['start_time'].strftime('%Y-%m-%d %H:%M:%S')}")
             print(f"   Finished: {result['end_time'].strftime('%Y-%m-%d %H:%M:%S')}")
@@ -172,6 +200,7 @@ class BackupRunner:
             
         except KeyboardInterrupt:
             print("\n⚠️  Backup interrupted by user")
+            print("   Continue later with: python -m src.core.backup_runner resume")
             return False
         except Exception as e:
             print_error(f"Backup failed: {e}")
@@ -180,22 +209,61 @@ class BackupRunner:
             if self.backup_engine and self.backup_engine.bandwidth_monitor:
                 self.backup_engine.stop_bandwidth_monitoring()
 
+    def run_prune(self) -> bool:
+        """Delete snapshots beyond the retention policy"""
+        try:
+            print_logo()
+            print_header("SNAPSHOT PRUNE")
+            self._print_session_info()
+            
+            config = self.config_manager.config
+            retention = config.get('snapshots', {}).get('retention', {})
+            print(f"📁 Snapshots: {Path(config['local_root']) / 'snapshots'}")
+            print(f"📅 Keep: {retention.get('keep_daily', 7)} daily, "
+                  f"{retention.get('keep_weekly', 4)} weekly, {retention.get('keep_monthly', 6)} monthly")
+            print("=" * 80)
+            
+            log_file = Path(config.get('log_dir', 'logs')) / f"prune_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+            log_file.parent.mkdir(parents=True, exist_ok=True)
+            
+            def log_message(message: str):
+                print(message)
+                with open(log_file, 'a') as f:
+                    f.write(f"[{datetime.now().strftime('%H:%M:%S')}] {message}\n")
+                    
+            result = SnapshotPruner(config).prune(log_message=log_message)
+            
+            if result['removed']['errors']:
+                print_error(f"Prune finished with {result['removed']['errors']} errors, see {log_file}")
+                return False
+                
+            print_success(f"Pruned {result['removed']['snapshots']} snapshots")
+            return True
+            
+        except KeyboardInterrupt:
+            print("\n⚠️  Prune interrupted by user")
+            print("   Run it again to finish the partly deleted snapshots")
+            return False
+        except Exception as e:
+            print_error(f"Prune failed: {e}")
+            return False
+
 def main():
     """Main entry point"""
     if len(sys.argv) < 2:
         print("Usage: python backup_runner.py <backup_type>")
-        print("Backup types: quick, full, longterm")
+        print("Backup types: quick, full, longterm, resume, prune")
         sys.exit(1)
         
     backup_type = sys.argv[1]
     
-    if backup_type not in ['quick', 'full', 'longterm']:
+    if backup_type not in ['quick', 'full', 'longterm', 'resume', 'prune']:
         print(f"Invalid backup type: {backup_type}")
-        print("Valid types: quick, full, longterm")
+        print("Valid types: quick, full, longterm, resume, prune")
         sys.exit(1)
         
     runner = BackupRunner(backup_type)
-    success = runner.run()
+    success = runner.run_prune() if backup_type == 'prune' else runner.run()
     
     sys.exit(0 if success else 1)
 
@@ -0,0 +1,155 @@
+"""
+Global bandwidth budget shared by the transfer workers
+"""
+
+import threading
+import time
+from typing import Callable, List, Optional
+
+# Pacing of in-process copies forgets bytes older than this, so a pause
+# never turns into a burst afterwards
+PACE_WINDOW = 5.0
+
+class BandwidthLease:
+    """Share of the bandwidth budget held by one running transfer"""
+    
+    def __init__(self, limit_bps: int, paced: bool = False):
+        self.limit_bps = limit_bps
+        self.paced = paced
+        self.started = time.monotonic()
+        self.process = None
+        self.rebalanced = False
+        self._window_start = self.started
+        self._window_bytes = 0
+        self._lock = threading.Lock()
+        
+    def pace(self, nbytes: int):
+        """Account for copied bytes and sleep while ahead of the limit"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start > PACE_WINDOW:
+                self._window_start = now
+                self._window_bytes = 0
+            self._window_bytes += nbytes
+            limit = self.limit_bps
+            delay = self._window_bytes / limit - (now - self._window_start) if limit else 0
+        if delay > 0:
+            time.sleep(delay)
+            
+    @property
+    def bwlimit_kbps(self) -> int:
+        """Limit in KB/s for rsync --bwlimit (0 = unlimited)"""
+        return max(1, self.limit_bps // 1024) if self.limit_bps else 0
+
+class BandwidthGovernor:
+    """Chia giới hạn băng thông chung cho các worker đang chạy"""
+    
+    def __init__(self, total_bps: int = 0, measure: Optional[Callable[[], Optional[float]]] = None,
+                 interval: float = 10, rebalance_ratio: float = 2.0, min_runtime: float = 60,
+                 concurrency: Optional[Callable[[], int]] = None):
+        self.total_bps = total_bps
+        self.measure = measure
+        self.concurrency = concurrency
+        self.interval = interval
+        self.rebalance_ratio = rebalance_ratio
+        self.min_runtime = min_runtime
+        self.factor = 1.0
+        self.leases: List[BandwidthLease] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        
+    @property
+    def enabled(self) -> bool:
+        return self.total_bps > 0
+        
+    def fair_share(self, extra: int = 0) -> int:
+        """Bytes/s each active transfer may use (0 = unlimited)"""
+        if not self.enabled:
+            return 0
+        expected = self.concurrency() if self.concurrency else 0
+        active = max(1, expected, len(self.leases) + extra)
+        return max(1024, int(self.total_bps * self.factor / active))
+        
+    def acquire(self, paced: bool = False) -> BandwidthLease:
+        """Register a transfer that is about to start and return its lease"""
+        with self._lock:
+            lease = BandwidthLease(self.fair_share(extra=1), paced)
+            self.leases.append(lease)
+            return lease
+            
+    def release(self, lease: BandwidthLease):
+        """Return the share of a finished transfer"""
+        with self._lock:
+            if lease in self.leases:
+                self.leases.remove(lease)
+                
+    def attach(self, lease: BandwidthLease, process):
+        """Bind the running process of a lease so it can be rebalanced"""
+        with self._lock:
+            lease.process = process
+            
+    def set_total(self, total_bps: int):
+        """Change the budget; running transfers are rebalanced on the next tick"""
+        with self._lock:
+            if total_bps != self.total_bps:
+                self.total_bps = total_bps
+                self.factor = 1.0
+                
+    def start(self):
+        """Start the control thread"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._control_loop, daemon=True)
+        self._thread.start()
+        
+    def stop(self):
+        """Stop the control thread"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+            
+    def _control_loop(self):
+        while not self._stop.wait(self.interval):
+            if self.enabled:
+                self._apply_feedback()
+            self._rebalance()
+            
+    def _apply_feedback(self):
+        """Scale shares so the measured rate approaches the budget"""
+        measured = self.measure() if self.measure else None
+        if not measured or not self.leases:
+            return
+            
+        with self._lock:
+            # Damped multiplicative correction, bounded so that a burst of
+            # other traffic cannot starve the backup or unleash it
+            ratio = (self.total_bps / measured) ** 0.5
+            self.factor = min(4.0, max(0.25, self.factor * ratio))
+            
+    def _rebalance(self):
+        """Restart transfers whose limit is far from the current fair share"""
+        now = time.monotonic()
+        with self._lock:
+            share = self.fair_share()
+            for lease in self.leases:
+                if lease.paced:
+                    # Paced copies pick up the new limit with their next block
+                    lease.limit_bps = share
+                    continue
+                process = lease.process
+                if process is None or process.poll() is not None or lease.rebalanced:
+                    continue
+                if now - lease.started < self.min_runtime:
+                    continue
+                    
+                # Switching between limited and unlimited always needs a restart
+                if not share or not lease.limit_bps:
+                    drift = 1.0 if share == lease.limit_bps else float('inf')
+                else:
+                    drift = share / lease.limit_bps
+                if drift >= self.rebalance_ratio or drift <= 1 / self.rebalance_ratio:
+                    lease.rebalanced = True
+                    process.terminate()
@@ -3,10 +3,78 @@ Core configuration management module
 """
 
 import os
+import re
 import yaml
 from pathlib import Path
 from typing import Dict, Any, Optional
 
+# Multipliers for human readable size values ("1GB", "512MB", "1GiB")
+SIZE_UNITS = {
+    'B': 1,
+    'K': 1024,
+    'KB': 1024,
+    'M': 1024 ** 2,
+    'MB': 1024 ** 2,
+    'G': 1024 ** 3,
+    'GB': 1024 ** 3,
+    'T': 1024 ** 4,
+    'TB': 1024 ** 4,
+    'KIB': 1024,
+    'MIB': 1024 ** 2,
+    'GIB': 1024 ** 3,
+    'TIB': 1024 ** 4,
+}
+
+# Size settings checked when the config is loaded, as (section, key)
+SIZE_FIELDS = (
+    ('scheduling', 'batch_bytes'),
+    ('large_files', 'threshold'),
+    ('large_files', 'range_size'),
+    ('tar_lane', 'small_file_threshold'),
+    ('tar_lane', 'batch_bytes'),
+    ('chunking', 'dedicated_lane_threshold'),
+    ('chunking', 'sort_threshold'),
+)
+
+_SIZE_VALUE = re.compile(r'^(\d+(?:\.\d*)?|\.\d+)([A-Z]*)$')
+
+def parse_size(value: Any, default: int = 0) -> int:
+    """Parse a size value like 1GB, 512MB or 1 GiB into bytes (0 = unlimited)
+    
+    Raises ValueError on values that are not sizes, so a typo in the
+    config never turns into "unlimited".
+    """
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return int(value)
+        
+    text = str(value).strip().upper().replace(' ', '')
+    if text in ('', 'UNLIMITED', 'NONE'):
+        return 0
+        
+    match = _SIZE_VALUE.match(text)
+    if not match or (match.group(2) or 'B') not in SIZE_UNITS:
+        raise ValueError(f"Invalid size: {value!r}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2) or 'B'])
+
+def parse_rate(value: Any, default: int = 0) -> int:
+    """Parse a bandwidth limit into bytes/s (0 = unlimited)
+    
+    Numbers without a unit are KB/s like rsync --bwlimit, also when quoted
+    ("1000"); strings may carry a unit ("20MB/s", "512KB").
+    """
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return int(value * 1024)
+        
+    text = str(value).strip().upper().replace(' ', '').replace('/S', '')
+    match = _SIZE_VALUE.match(text)
+    if match and not match.group(2):
+        return int(float(match.group(1)) * 1024)
+    return parse_size(text, default)
+
 class ConfigManager:
     """Quản lý cấu hình ứng dụng"""
     
@@ -82,6 +150,19 @@ class ConfigManager:
             else:
                 self._config[field] = default
                 
+        # Fail on a mistyped size now rather than halfway through a run
+        for section, key in SIZE_FIELDS:
+            value = (self._config.get(section) or {}).get(key)
+            try:
+                parse_size(value)
+            except ValueError:
+                raise ValueError(f"Invalid size for {section}.{key}: {value!r}")
+        for name, backup_type in (self._config.get('backup_types') or {}).items():
+            try:
+                parse_size((backup_type or {}).get('max_size'))
+            except ValueError:
+                raise ValueError(f"Invalid size for backup_types.{name}.max_size: {backup_type['max_size']!r}")
+                
     def get(self, key: str, default: Any = None) -> Any:
         """Get configuration value"""
         if not self._config:
@@ -0,0 +1,303 @@
+"""
+Remote file listing format and parsing
+"""
+
+import heapq
+import shlex
+import threading
+import time
+from pathlib import Path
+from typing import IO, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# Listings, chunk file lists and journals hold NUL-terminated records: NUL
+# is the only byte a path cannot contain, newlines and blanks included
+RECORD_SEPARATOR = b'\0'
+
+# find -printf format for one listing record: size, mtime, inode, path
+LISTING_PRINTF = r'%s\t%T@\t%i\t%p\0'
+
+# Read size when streaming record files
+RECORD_READ_BLOCK = 1024 * 1024
+
+# Passes of select_within_budget over the listing; each fills what is left
+SELECTION_PASSES = 4
+
+def encode_path(path: str) -> bytes:
+    """Bytes of a path as the filesystem has them"""
+    return path.encode('utf-8', 'surrogateescape')
+
+def decode_path(raw: bytes) -> str:
+    """Path from raw bytes; bytes that are not UTF-8 survive as surrogates"""
+    return raw.decode('utf-8', 'surrogateescape')
+
+def open_records(path, mode: str = 'r', buffering: int = -1) -> IO[str]:
+    """Open a record file as text that writes every path back byte for byte"""
+    return open(path, mode, buffering=buffering, encoding='utf-8',
+                errors='surrogateescape', newline='')
+
+def iter_records(path, block_size: int = RECORD_READ_BLOCK) -> Iterator[bytes]:
+    """Stream the NUL-terminated records of a file as bytes"""
+    pending = b''
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            *records, pending = (pending + block).split(RECORD_SEPARATOR)
+            yield from records
+    if pending:
+        yield pending
+
+class FileEntry(NamedTuple):
+    """One file from the remote listing"""
+    path: str
+    size: int
+    mtime: float
+    inode: int = 0
+
+def _match_expression(pattern: str) -> str:
+    """find test matching a name pattern, or a path pattern if it has a '/'"""
+    pattern = pattern.strip('/')
+    if '/' in pattern:
+        return f"-path {shlex.quote('*/' + pattern)}"
+    return f"-name {shlex.quote(pattern)}"
+
+def _any_of(tests: List[str]) -> str:
+    """Group find tests with -o"""
+    return '\\( ' + ' -o '.join(tests) + ' \\)'
+
+def build_filter_expressions(exclude_patterns: List[str] = None,
+                             include_patterns: List[str] = None) -> Tuple[str, str]:
+    """Compile backup_types patterns into find expressions
+    
+    Patterns naming a directory's content ('node_modules/*', 'cache/') become
+    a -prune expression, so excluded subtrees are never walked on the
+    remote side. Other exclude patterns ('*.log') filter files by name, or by
+    path when they contain a '/'. Include patterns keep matching files only.
+    Returns (prune expression, file filter expression).
+    """
+    prune_dirs = []
+    file_tests = []
+    
+    for pattern in exclude_patterns or []:
+        if pattern.endswith('/*') or pattern.endswith('/'):
+            prune_dirs.append(_match_expression(pattern.rstrip('*').rstrip('/')))
+        else:
+            file_tests.append(_match_expression(pattern))
+            
+    prune = ''
+    if prune_dirs:
+        # -mindepth 1 keeps the root itself from being pruned
+        prune = f"-mindepth 1 -type d {_any_of(prune_dirs)} -prune -o "
+        
+    file_filter = ''
+    if file_tests:
+        file_filter += f"! {_any_of(file_tests)} "
+    if include_patterns:
+        file_filter += f"{_any_of([_match_expression(p) for p in include_patterns])} "
+        
+    return prune, file_filter
+
+def build_find_command(remote_root: str, since: Optional[int] = None,
+                       exclude_patterns: List[str] = None,
+                       include_patterns: List[str] = None,
+                       max_depth: Optional[int] = None) -> str:
+    """Build remote find command producing a sized listing
+    
+    With since (remote epoch seconds) only files whose content or inode
+    status changed after that moment are listed. max_depth limits the walk
+    to files at most that many levels below remote_root.
+    """
+    prune, file_filter = build_filter_expressions(exclude_patterns, include_patterns)
+    
+    depth = f"-maxdepth {max_depth} " if max_depth is not None else ''
+    newer = ''
+    if since is not None:
+        newer = f"\\( -newermt @{since} -o -newerct @{since} \\) "
+    return (f"find {shlex.quote(remote_root)} {depth}{prune}-type f {file_filter}{newer}"
+            f"-printf '{LISTING_PRINTF}'")
+
+def build_split_command(remote_root: str, depth: int,
+                        exclude_patterns: List[str] = None) -> str:
+    """Build remote find command listing the directories to split a walk on
+    
+    Prints 'depth<TAB>path' records for directories down to `depth`
+    levels, with excluded directories pruned like in the listing itself.
+    """
+    prune, _ = build_filter_expressions(exclude_patterns)
+    return f"find {shlex.quote(remote_root)} -maxdepth {depth} {prune}-type d -printf '%d\\t%p\\0'"
+
+def relative_path(path: str, remote_root: str) -> str:
+    """Strip remote_root prefix from a listed path"""
+    if path.startswith(remote_root):
+        return path[len(remote_root):].lstrip('/')
+    return path
+
+def parse_listing_record(record: bytes) -> Optional[FileEntry]:
+    """Parse one raw 'size<TAB>mtime<TAB>inode<TAB>path' listing record
+    
+    The path is the last field, so tabs inside it are kept.
+    """
+    parts = record.split(b'\t', 3)
+    if len(parts) != 4:
+        return None
+        
+    try:
+        return FileEntry(decode_path(parts[3]), int(parts[0]), float(parts[1]), int(parts[2]))
+    except ValueError:
+        return None
+
+def write_listing_record(f: IO[str], entry: FileEntry, remote_root: str):
+    """Write an entry with a relative path back as a full listing record
+    
+    f must come from open_records.
+    """
+    path = f"{remote_root.rstrip('/')}/{entry.path}"
+    f.write(f"{entry.size}\t{entry.mtime}\t{entry.inode}\t{path}\0")
+
+def iter_listing(listing_path: str, remote_root: str) -> Iterator[FileEntry]:
+    """Stream listing records with paths relative to remote_root"""
+    remote_root = remote_root.rstrip('/')
+    
+    for record in iter_records(listing_path):
+        entry = parse_listing_record(record)
+        if entry is None:
+            continue
+            
+        path = relative_path(entry.path, remote_root)
+        if path:
+            yield entry._replace(path=path)
+
+def follow_listing(listing_path: str, remote_root: str, finished: threading.Event,
+                   poll_interval: float = 0.2) -> Iterator[FileEntry]:
+    """Stream records of a listing file while it is still being written
+    
+    Like iter_listing, but at the end of the file it waits for more data
+    until `finished` is set. A trailing record without its terminator is
+    held back until the rest of it arrives.
+    """
+    remote_root = remote_root.rstrip('/')
+    pending = b''
+    
+    with open(listing_path, 'rb') as f:
+        while True:
+            data = f.read(RECORD_READ_BLOCK)
+            if not data:
+                if not finished.is_set():
+                    time.sleep(poll_interval)
+                    continue
+                # The writer is done: whatever is left is the real end
+                data = f.read()
+                if not data:
+                    break
+                    
+            *records, pending = (pending + data).split(RECORD_SEPARATOR)
+            for record in records:
+                entry = parse_listing_record(record)
+                if entry is None:
+                    continue
+                path = relative_path(entry.path, remote_root)
+                if path:
+                    yield entry._replace(path=path)
+
+class BatchWriter:
+    """Write file paths into numbered batch files of bounded files and bytes"""
+    
+    def __init__(self, batch_dir: Path, prefix: str, max_files: int, max_bytes: int,
+                 buffering: int = 1024 * 1024):
+        self.batch_dir = Path(batch_dir)
+        self.prefix = prefix
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.buffering = buffering
+        self.batches: List[str] = []
+        self.batch_bytes: Dict[str, int] = {}
+        self._writer = None
+        self._files = 0
+        self._bytes = 0
+        
+    def add(self, entry: FileEntry) -> Optional[str]:
+        """Append an entry, return the batch path if this closed a batch"""
+        if self._writer is None:
+            batch_path = str(self.batch_dir / f'{self.prefix}_{len(self.batches)+1:05d}.txt')
+            self._writer = open_records(batch_path, 'w', buffering=self.buffering)
+            self.batches.append(batch_path)
+            self._files = self._bytes = 0
+            
+        self._writer.write(entry.path + '\0')
+        self._files += 1
+        self._bytes += entry.size
+        
+        if self._files >= self.max_files or (self.max_bytes and self._bytes >= self.max_bytes):
+            return self.close()
+        return None
+        
+    def close(self) -> Optional[str]:
+        """Close the open batch, return its path if there was one"""
+        if self._writer is None:
+            return None
+            
+        self._writer.close()
+        self._writer = None
+        batch_path = self.batches[-1]
+        self.batch_bytes[batch_path] = self._bytes
+        return batch_path
+
+def select_within_budget(listing: Callable[[], Iterable[FileEntry]], budget: int, order: str = 'recent',
+                         priority_paths: List[str] = None) -> List[FileEntry]:
+    """Pick the best files that fit into a byte budget in a few streaming passes
+    
+    order is 'recent' (newest mtime first), 'smallest' or 'priority'
+    (entries under earlier priority_paths first, newest first within a
+    rank). Instead of sorting the whole listing, a heap keeps the current
+    selection with its worst entry on top. An entry that does not fit only
+    pushes out worse entries, and only if that makes room. Later passes over
+    listing() fill the space left with files not selected yet. Memory is
+    bounded by the size of the selection.
+    """
+    priority_paths = [p.strip('/') for p in priority_paths or []]
+    
+    def rank(path: str) -> int:
+        for idx, prefix in enumerate(priority_paths):
+            if path == prefix or path.startswith(prefix + '/'):
+                return idx
+        return len(priority_paths)
+        
+    # Heap keys: the smallest key is the worst entry and is evicted first
+    if order == 'smallest':
+        key = lambda entry: -entry.size
+    elif order == 'priority':
+        key = lambda entry: (-rank(entry.path), entry.mtime)
+    else:
+        key = lambda entry: entry.mtime
+        
+    selected = []
+    chosen = set()
+    remaining = budget
+    for _ in range(SELECTION_PASSES):
+        heap = []
+        total = 0
+        for counter, entry in enumerate(listing()):
+            if entry.size > remaining or counter in chosen:
+                continue
+            item = (key(entry), counter, entry)
+            evicted = []
+            while total + entry.size > remaining and heap and heap[0][:2] < item[:2]:
+                evicted.append(heapq.heappop(heap))
+                total -= evicted[-1][2].size
+            if total + entry.size <= remaining:
+                heapq.heappush(heap, item)
+                total += entry.size
+            else:
+                # Dropping every worse entry still leaves no room: keep them
+                for worse in evicted:
+                    heapq.heappush(heap, worse)
+                    total += worse[2].size
+                    
+        if not heap:
+            break
+        selected.extend(heap)
+        chosen.update(counter for _, counter, _ in heap)
+        remaining -= total
+        
+    return [item[2] for item in sorted(selected, key=lambda item: item[:2], reverse=True)]
@@ -0,0 +1,207 @@
+"""
+Per-file completion journal for chunk retries
+"""
+
+import codecs
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from .filelist import RECORD_SEPARATOR, decode_path, encode_path, iter_records, open_records
+
+# rsync --out-format for journal lines, logged once a file is finished (%b)
+JOURNAL_OUT_FORMAT = '@done %i %b %n'
+
+# Itemize twice so files found up to date are logged (and journaled) too
+JOURNAL_ITEMIZE = '-ii'
+
+# Up-to-date files itemize as '.f' padded with spaces instead of dots
+_DONE_LINE = re.compile(r'^@done (\S+) +(\d+) (.*)$')
+_ESCAPED_BYTE = re.compile(rb'\\#([0-7]{3})')
+
+# rsync exit codes of a transfer that finished with per-file errors
+PARTIAL_EXIT_CODES = {23, 24}
+
+# Kinds of per-file errors: vanished files are not an error for a backup,
+# denied files fail again on every retry, other errors are worth a retry
+FILE_VANISHED = 'vanished'
+FILE_DENIED = 'denied'
+FILE_ERROR = 'error'
+
+# Files never handed to rsync again within a run
+SETTLED_KINDS = (FILE_VANISHED, FILE_DENIED)
+
+# Source-side per-file messages, e.g.
+#   file has vanished: "/home/a/tmp.swp"
+#   rsync: [sender] send_files failed to open "/home/a/key": Permission denied (13)
+#   rsync: link_stat "/home/a/b" failed: No such file or directory (2)
+_FILE_ERROR_LINE = re.compile(
+    r'^(?:rsync: )?(?:\[\w+\] )?'
+    r'(?:file has vanished: |send_files failed to open |link_stat |read errors mapping )'
+    r'"(.+)"([^"]*)$'
+)
+_ERRNO = re.compile(r'\((\d+)\)\s*$')
+_VANISHED_ERRNOS = {'2'}
+_DENIED_ERRNOS = {'1', '13'}
+
+# GNU tar per-file messages with --ignore-failed-read, e.g.
+#   tar: Maildir/new/1700000000.M1: Warning: Cannot stat: No such file or directory
+#   tar: home/a/key: Warning: Cannot open: Permission denied
+_TAR_ERROR_LINE = re.compile(r'^tar: (.+?): (?:Warning: )?Cannot (?:stat|open|read|readlink): (.+)$')
+_TAR_VANISHED_REASONS = ('No such file or directory',)
+_TAR_DENIED_REASONS = ('Permission denied', 'Operation not permitted')
+
+def _unescape(path: str) -> str:
+    """Undo rsync's \\#ooo escapes, which stand for single raw bytes"""
+    raw = _ESCAPED_BYTE.sub(lambda m: bytes([int(m.group(1), 8)]), encode_path(path))
+    return decode_path(raw)
+
+def parse_done_record(line: str) -> Optional[Tuple[str, int]]:
+    """Return the path and bytes moved of a file rsync reports as finished"""
+    match = _DONE_LINE.match(line.rstrip('\n'))
+    if not match:
+        return None
+        
+    itemize, transferred, path = match.groups()
+    if len(itemize) < 2 or itemize[1] != 'f':
+        return None
+        
+    # rsync escapes unprintable characters as \#ooo
+    return _unescape(path), int(transferred)
+
+def parse_error_line(line: str, remote_root: str) -> Optional[Tuple[str, str, str]]:
+    """Return (kind, path, reason) of a per-file error rsync reports, if any
+    
+    Paths are made relative to remote_root like the chunk file lists.
+    """
+    line = line.rstrip('\n')
+    match = _FILE_ERROR_LINE.match(line)
+    if not match:
+        return None
+        
+    path, rest = match.groups()
+    path = _unescape(path)
+    prefix = remote_root.rstrip('/') + '/'
+    if path.startswith(prefix):
+        path = path[len(prefix):]
+        
+    reason = rest.split(': ', 1)[-1].strip() or 'file has vanished'
+    errno = _ERRNO.search(rest)
+    if line.startswith('file has vanished') or (errno and errno.group(1) in _VANISHED_ERRNOS):
+        return FILE_VANISHED, path, reason
+    if errno and errno.group(1) in _DENIED_ERRNOS:
+        return FILE_DENIED, path, reason
+    return FILE_ERROR, path, reason
+
+def unescape_tar_name(raw: bytes) -> str:
+    """Path from a name GNU tar printed with --quoting-style=escape"""
+    return decode_path(codecs.escape_decode(raw)[0])
+
+def parse_tar_error_line(line: str) -> Optional[Tuple[str, str, str]]:
+    """Return (kind, path, reason) of a per-file error GNU tar reports, if any
+    
+    The remote tar runs inside remote_root, so paths are already relative.
+    """
+    match = _TAR_ERROR_LINE.match(line.rstrip('\n'))
+    if not match:
+        return None
+        
+    name, reason = match.groups()
+    path = unescape_tar_name(encode_path(name))
+    if reason in _TAR_VANISHED_REASONS:
+        return FILE_VANISHED, path, reason
+    if reason in _TAR_DENIED_REASONS:
+        return FILE_DENIED, path, reason
+    return FILE_ERROR, path, reason
+
+class JournalWriter:
+    """Appends finished paths to a chunk journal as NUL-terminated records"""
+    
+    def __init__(self, journal_path: Path):
+        # Unbuffered: every finished file is on disk before the next one
+        self._file = open(journal_path, 'ab', buffering=0)
+        
+    def add(self, path: str):
+        """Record one finished file"""
+        self._file.write(encode_path(path) + RECORD_SEPARATOR)
+        
+    def close(self):
+        self._file.close()
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, *exc_info):
+        self.close()
+
+class CompletionJournal:
+    """Append-only journal of the files already transferred for each chunk
+    
+    Retries, retry rounds and restarted runs read the journal and hand rsync
+    a reduced list holding only the files that are not done yet.
+    """
+    
+    def __init__(self, journal_dir: str):
+        self.journal_dir = Path(journal_dir)
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        
+    def journal_path(self, chunk_path: str) -> Path:
+        """Journal file of a chunk"""
+        return self.journal_dir / f'{Path(chunk_path).stem}.done'
+        
+    def open_writer(self, chunk_path: str) -> JournalWriter:
+        """Open a chunk journal for appending, one record per finished file"""
+        return JournalWriter(self.journal_path(chunk_path))
+        
+    def errors_path(self, chunk_path: str) -> Path:
+        """Per-file error records of a chunk"""
+        return self.journal_dir / f'{Path(chunk_path).stem}.errors'
+        
+    def record_errors(self, chunk_path: str, errors: Dict[str, Tuple[str, str]]):
+        """Append per-file errors (path -> (kind, message)) of one attempt"""
+        if not errors:
+            return
+        with open_records(self.errors_path(chunk_path), 'a') as f:
+            for path, (kind, message) in errors.items():
+                f.write(f"{kind}\t{path}\t{message}\0")
+                
+    def file_errors(self, chunk_path: str) -> Dict[str, Tuple[str, str]]:
+        """Latest error per path of a chunk, path -> (kind, message)"""
+        errors = {}
+        errors_path = self.errors_path(chunk_path)
+        if not errors_path.exists():
+            return errors
+        for record in iter_records(errors_path):
+            # The path may hold tabs itself: kind first, message last
+            kind, _, rest = decode_path(record).partition('\t')
+            path, _, message = rest.rpartition('\t')
+            if path:
+                errors[path] = (kind, message)
+        return errors
+        
+    def completed(self, chunk_path: str) -> Set[bytes]:
+        """Raw paths of a chunk already journaled as done"""
+        journal_path = self.journal_path(chunk_path)
+        if not journal_path.exists():
+            return set()
+        return {record for record in iter_records(journal_path) if record}
+        
+    def pending_list(self, chunk_path: str, skip: Iterable[str] = ()) -> Tuple[str, int]:
+        """Return a file list of the chunk without journaled files and its size
+        
+        Paths in skip are left out too. The original chunk file is returned
+        as is when nothing is done or skipped yet. Records are compared as
+        raw bytes, nothing is decoded.
+        """
+        done = self.completed(chunk_path) | {encode_path(path) for path in skip}
+        if not done:
+            return chunk_path, sum(1 for record in iter_records(chunk_path) if record)
+            
+        pending_path = self.journal_dir / f'{Path(chunk_path).stem}.pending'
+        remaining = 0
+        with open(pending_path, 'wb') as dst:
+            for record in iter_records(chunk_path):
+                if record and record not in done:
+                    dst.write(record + RECORD_SEPARATOR)
+                    remaining += 1
+        return str(pending_path), remaining
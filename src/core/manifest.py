@@ -0,0 +1,155 @@
+"""
+Local manifest database for incremental backups
+"""
+
+import sqlite3
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from .filelist import FileEntry, decode_path, encode_path
+
+# Rows per executemany() batch when staging a listing
+STAGE_BATCH_SIZE = 10000
+
+# Layout of the files table; paths are BLOBs holding the raw filesystem
+# bytes, TEXT columns reject names that are not valid UTF-8
+SCHEMA_VERSION = '2'
+
+_FILES_COLUMNS = "path BLOB PRIMARY KEY, size INTEGER, mtime REAL, inode INTEGER"
+
+class ManifestStore:
+    """SQLite manifest of the files (path, size, mtime, inode) of the last run
+    
+    A new listing is staged into its own table and diffed against the stored
+    manifest with a join on the path primary key. Both tables are ordered
+    B-trees on disk, so the diff streams in path order with bounded memory.
+    The staged listing only replaces the manifest once a run succeeded.
+    Paths are stored as raw bytes so any filename round-trips.
+    """
+    
+    def __init__(self, db_path: str, source: str):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.source = source
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._init_schema()
+        
+    def _init_schema(self):
+        """Create tables and drop a manifest that belongs to another source"""
+        cur = self.conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        
+        row = cur.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+        if row is None or row[0] != SCHEMA_VERSION:
+            # Older manifests keep TEXT paths that never match BLOB ones
+            cur.execute("DROP TABLE IF EXISTS files")
+            cur.execute("INSERT OR REPLACE INTO meta VALUES ('schema', ?)", (SCHEMA_VERSION,))
+        cur.execute(f"CREATE TABLE IF NOT EXISTS files ({_FILES_COLUMNS}) WITHOUT ROWID")
+        cur.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            "id INTEGER PRIMARY KEY, finished TEXT, backup_type TEXT, file_count INTEGER"
+            ")"
+        )
+        
+        row = cur.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        if row is None or row[0] != self.source:
+            # Remote host or root changed: the old manifest is meaningless
+            cur.execute("DELETE FROM files")
+            cur.execute("DELETE FROM meta")
+            cur.execute("INSERT OR REPLACE INTO meta VALUES ('source', ?)", (self.source,))
+            cur.execute("INSERT OR REPLACE INTO meta VALUES ('schema', ?)", (SCHEMA_VERSION,))
+        self.conn.commit()
+        
+    def file_count(self) -> int:
+        """Number of files in the stored manifest"""
+        return self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        
+    def stage_listing(self, entries: Iterable[FileEntry]) -> int:
+        """Load a new listing into the staging table, return its file count"""
+        cur = self.conn.cursor()
+        cur.execute("DROP TABLE IF EXISTS staged")
+        cur.execute(f"CREATE TABLE staged ({_FILES_COLUMNS}) WITHOUT ROWID")
+        
+        count = 0
+        batch = []
+        for entry in entries:
+            batch.append((encode_path(entry.path), entry.size, entry.mtime, entry.inode))
+            if len(batch) >= STAGE_BATCH_SIZE:
+                cur.executemany("INSERT OR REPLACE INTO staged VALUES (?, ?, ?, ?)", batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            cur.executemany("INSERT OR REPLACE INTO staged VALUES (?, ?, ?, ?)", batch)
+            count += len(batch)
+            
+        self.conn.commit()
+        return count
+        
+    def iter_changed(self) -> Iterator[FileEntry]:
+        """Stream staged files that are new or differ from the manifest"""
+        cursor = self.conn.execute(
+            "SELECT s.path, s.size, s.mtime, s.inode FROM staged s "
+            "LEFT JOIN files f ON f.path = s.path "
+            "WHERE f.path IS NULL OR f.size != s.size "
+            "OR f.mtime != s.mtime OR f.inode != s.inode "
+            "ORDER BY s.path"
+        )
+        for path, size, mtime, inode in cursor:
+            yield FileEntry(decode_path(path), size, mtime, inode)
+            
+    def iter_unchanged(self, partial: bool = False) -> Iterator[str]:
+        """Stream manifest paths the staged listing reports as unchanged
+        
+        For a partial listing (changed files only) every manifest path that
+        is not staged is unchanged.
+        """
+        if partial:
+            query = (
+                "SELECT f.path FROM files f "
+                "WHERE NOT EXISTS (SELECT 1 FROM staged s WHERE s.path = f.path) "
+                "ORDER BY f.path"
+            )
+        else:
+            query = (
+                "SELECT s.path FROM staged s JOIN files f ON f.path = s.path "
+                "WHERE f.size = s.size AND f.mtime = s.mtime AND f.inode = s.inode "
+                "ORDER BY s.path"
+            )
+        for row in self.conn.execute(query):
+            yield decode_path(row[0])
+            
+    def get_meta(self, key: str, default: str = None) -> str:
+        """Read a metadata value"""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+        
+    def set_meta(self, key: str, value: str):
+        """Store a metadata value"""
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+        self.conn.commit()
+        
+    def commit(self, backup_type: str, finished: str, partial: bool = False):
+        """Make the staged listing the new manifest after a successful run
+        
+        A partial listing (changed files only) is merged into the manifest
+        instead of replacing it.
+        """
+        cur = self.conn.cursor()
+        count = cur.execute("SELECT COUNT(*) FROM staged").fetchone()[0]
+        if partial:
+            cur.execute("INSERT OR REPLACE INTO files SELECT * FROM staged")
+            cur.execute("DROP TABLE staged")
+        else:
+            cur.execute("DROP TABLE files")
+            cur.execute("ALTER TABLE staged RENAME TO files")
+        cur.execute(
+            "INSERT INTO runs (finished, backup_type, file_count) VALUES (?, ?, ?)",
+            (finished, backup_type, count)
+        )
+        self.conn.commit()
+        
+    def close(self):
+        """Close the database"""
+        self.conn.close()
@@ -0,0 +1,227 @@
+"""
+Parallel byte-range transfer of very large files
+"""
+
+import hashlib
+import os
+import re
+import shlex
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .bandwidth import BandwidthLease
+from .config import parse_size
+from .ssh import SSHManager
+from .watchdog import TransferProcesses
+
+# Suffix of the preallocated file while its ranges are being fetched
+PART_SUFFIX = '.vpsb-part'
+
+# Read size when copying a range from ssh into the local file
+RANGE_READ_BLOCK = 1024 * 1024
+
+_SHA256 = re.compile(r'\b([0-9a-f]{64})\b')
+
+class RangeTransfer:
+    """Tải một file rất lớn bằng nhiều luồng song song theo byte range"""
+    
+    def __init__(self, ssh_manager: SSHManager, config: Dict[str, Any],
+                 processes: Optional[TransferProcesses] = None):
+        self.ssh_manager = ssh_manager
+        self.processes = processes or TransferProcesses()
+        large_files = config.get('large_files', {})
+        self.range_size = max(RANGE_READ_BLOCK, parse_size(large_files.get('range_size', '256MB')))
+        self.streams = max(1, int(large_files.get('streams', 8)))
+        self.range_timeout = int(large_files.get('range_timeout', 3600))
+        self.max_retries = config.get('retry_count', 3)
+        self._lock = threading.Lock()
+        
+    def remote_stat(self, remote_path: str) -> Optional[Tuple[int, int, int]]:
+        """Size, mtime and permission bits of a remote file"""
+        success, stdout, _ = self.ssh_manager.run_command(
+            f"stat -c '%s %Y %a' {shlex.quote(remote_path)}"
+        )
+        if not success:
+            return None
+        try:
+            size, mtime, mode = stdout.split()
+            return int(size), int(mtime), int(mode, 8)
+        except ValueError:
+            return None
+            
+    def _range_command(self, remote_path: str, offset: int, length: int) -> str:
+        """Remote command printing one byte range and its sha256 on stderr"""
+        dd = (f"dd if={shlex.quote(remote_path)} iflag=skip_bytes,count_bytes "
+              f"skip={offset} count={length} bs={RANGE_READ_BLOCK} status=none")
+        # tee sends the data to the original stdout (fd 3) and to sha256sum
+        return f"{{ {dd} | tee /dev/fd/3 | sha256sum >&2; }} 3>&1"
+        
+    def _fetch_range(self, remote_path: str, fd: int, offset: int, length: int,
+                     slot: int, lease: Optional[BandwidthLease] = None) -> Tuple[bool, str]:
+        """Copy one range into the local file, return (verified, detail)"""
+        cmd = self.ssh_manager.ssh_command(slot) + [self._range_command(remote_path, offset, length)]
+        digest = hashlib.sha256()
+        position = offset
+        
+        with tempfile.TemporaryFile() as stderr_file:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+            self.processes.add(process)
+            timer = threading.Timer(self.range_timeout, process.kill)
+            timer.start()
+            try:
+                while True:
+                    block = process.stdout.read(RANGE_READ_BLOCK)
+                    if not block:
+                        break
+                    view = memoryview(block)
+                    while view:
+                        written = os.pwrite(fd, view, position)
+                        view = view[written:]
+                        position += written
+                    digest.update(block)
+                    if lease is not None:
+                        lease.pace(len(block))
+                process.wait()
+            finally:
+                timer.cancel()
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                self.processes.discard(process)
+                
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode('utf-8', errors='replace')
+            
+        received = position - offset
+        if received != length:
+            return False, f"short range: {received}/{length} bytes {stderr.strip()[-200:]}"
+            
+        match = _SHA256.findall(stderr)
+        if not match or match[-1] != digest.hexdigest():
+            return False, "checksum mismatch"
+        return True, digest.hexdigest()
+        
+    def _load_done(self, state_path: str, size: int, mtime: int) -> Set[int]:
+        """Offsets already verified for this exact remote version"""
+        done = set()
+        try:
+            with open(state_path) as f:
+                if f.readline().split() != [str(size), str(mtime), str(self.range_size)]:
+                    return set()
+                for line in f:
+                    offset, _, _ = line.partition('\t')
+                    if offset.strip().isdigit():
+                        done.add(int(offset))
+        except OSError:
+            pass
+        return done
+        
+    def fetch(self, remote_path: str, local_path: str, slot: int = 0, log_file=None,
+              link_dest: Optional[str] = None,
+              lease: Optional[BandwidthLease] = None) -> Tuple[bool, str]:
+        """Fetch a remote file by parallel ranges into local_path
+        
+        All streams together stay within the paced lease, if one is given.
+        """
+        def log(message: str):
+            if log_file:
+                with self._lock:
+                    log_file.write(message + '\n')
+                    log_file.flush()
+                    
+        stat = self.remote_stat(remote_path)
+        if stat is None:
+            return False, f"Cannot stat remote file {remote_path}"
+        size, mtime, mode = stat
+        
+        # Same size and mtime as the local copy: nothing to fetch
+        if self._unchanged(local_path, size, mtime):
+            log(f"Unchanged: {local_path}")
+            return True, "unchanged"
+        if link_dest and not os.path.exists(local_path) and self._unchanged(link_dest, size, mtime):
+            os.link(link_dest, local_path)
+            log(f"Hard-linked from {link_dest}")
+            return True, "linked"
+            
+        part_path = local_path + PART_SUFFIX
+        state_path = part_path + '.ranges'
+        done = self._load_done(state_path, size, mtime)
+        if not done or not os.path.exists(part_path) or os.path.getsize(part_path) != size:
+            done = set()
+            self._preallocate(part_path, size)
+            with open(state_path, 'w') as f:
+                f.write(f"{size} {mtime} {self.range_size}\n")
+                
+        ranges = [(offset, min(self.range_size, size - offset))
+                  for offset in range(0, size, self.range_size) if offset not in done]
+        log(f"Ranges: {len(ranges)} pending of {(size + self.range_size - 1) // self.range_size}, "
+            f"{self.streams} streams")
+            
+        failed = self._fetch_ranges(remote_path, part_path, state_path, ranges, slot, log, lease)
+        if failed:
+            return False, f"{len(failed)} ranges failed"
+            
+        os.chmod(part_path, mode)
+        os.utime(part_path, (mtime, mtime))
+        os.replace(part_path, local_path)
+        os.unlink(state_path)
+        return True, "fetched"
+        
+    def _fetch_ranges(self, remote_path: str, part_path: str, state_path: str,
+                      ranges: List[Tuple[int, int]], slot: int, log,
+                      lease: Optional[BandwidthLease] = None) -> List[int]:
+        """Fetch ranges in parallel with retries, return offsets that failed"""
+        fd = os.open(part_path, os.O_WRONLY)
+        failed = []
+        
+        def fetch_with_retries(index: int, offset: int, length: int) -> bool:
+            for attempt in range(self.max_retries + 1):
+                if self.processes.stopped.is_set():
+                    return False
+                ok, detail = self._fetch_range(remote_path, fd, offset, length, slot + index, lease)
+                if ok:
+                    with self._lock:
+                        with open(state_path, 'a') as state:
+                            state.write(f"{offset}\t{detail}\n")
+                    return True
+                log(f"Range {offset}+{length} attempt {attempt + 1}: {detail}")
+            return False
+            
+        try:
+            with ThreadPoolExecutor(max_workers=self.streams) as executor:
+                futures = {
+                    executor.submit(fetch_with_retries, index, offset, length): offset
+                    for index, (offset, length) in enumerate(ranges)
+                }
+                for future in as_completed(futures):
+                    if not future.result():
+                        failed.append(futures[future])
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+            
+        return failed
+        
+    def _unchanged(self, path: str, size: int, mtime: int) -> bool:
+        """Quick check like rsync: same size and modification time"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        return st.st_size == size and int(st.st_mtime) == mtime
+        
+    def _preallocate(self, part_path: str, size: int):
+        """Create the part file at its final size so ranges can be written anywhere"""
+        fd = os.open(part_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            try:
+                if size:
+                    os.posix_fallocate(fd, 0, size)
+            except (AttributeError, OSError):
+                # Filesystem without fallocate support: sparse file instead
+                os.ftruncate(fd, size)
+        finally:
+            os.close(fd)
@@ -0,0 +1,264 @@
+"""
+Snapshot retention policy and parallel pruning
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .state import RunState
+
+# Snapshot directories are named after the run id: %Y%m%d_%H%M%S[_N]
+SNAPSHOT_TIME_FORMAT = '%Y%m%d_%H%M%S'
+
+# Snapshots being deleted are renamed first so they never look complete
+DELETING_PREFIX = '.deleting-'
+
+# Written into a snapshot once its run completed, before 'latest' moves to it
+COMPLETE_MARKER = '.vpsb-complete'
+
+# Bucket keys of the retention tiers: newest snapshot per day, ISO week, month
+RETENTION_BUCKETS = (
+    ('keep_daily', '%Y-%m-%d'),
+    ('keep_weekly', '%G-W%V'),
+    ('keep_monthly', '%Y-%m'),
+)
+
+def snapshot_time(name: str) -> Optional[datetime]:
+    """Creation time encoded in a snapshot name, if it is one"""
+    try:
+        return datetime.strptime(name[:15], SNAPSHOT_TIME_FORMAT)
+    except ValueError:
+        return None
+
+def select_snapshots(names: Iterable[str], policy: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """Split snapshot names into (keep, prune) following the retention policy
+    
+    Each tier keeps the newest snapshot of its N most recent buckets, a
+    snapshot may satisfy several tiers at once. Names that are not
+    snapshots are never pruned.
+    """
+    dated = ((snapshot_time(name), name) for name in names)
+    dated = sorted(((ts, name) for ts, name in dated if ts is not None), reverse=True)
+    
+    keep = set()
+    for key, bucket_format in RETENTION_BUCKETS:
+        limit = int(policy.get(key, 0) or 0)
+        buckets = set()
+        for ts, name in dated:
+            bucket = ts.strftime(bucket_format)
+            if bucket in buckets:
+                continue
+            if len(buckets) >= limit:
+                break
+            buckets.add(bucket)
+            keep.add(name)
+            
+    kept = [name for _, name in dated if name in keep]
+    pruned = [name for _, name in dated if name not in keep]
+    return kept, pruned
+
+class TokenBucket:
+    """Thread-safe token bucket limiting filesystem operations per second"""
+    
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(rate, 1))
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+        
+    def consume(self, amount: int = 1):
+        """Block until `amount` tokens are available (rate 0 = unlimited)"""
+        if self.rate <= 0:
+            return
+            
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            
+            # Borrow from the future and sleep off the debt while holding the
+            # lock, so every worker is paced by the same budget
+            self.tokens -= amount
+            if self.tokens < 0:
+                time.sleep(-self.tokens / self.rate)
+                self.last = time.monotonic()
+                self.tokens = 0
+
+class SnapshotPruner:
+    """Xóa snapshot cũ theo chính sách lưu giữ
+    
+    Snapshots are made of hard links, so deleting one is pure metadata
+    work. The tree is walked by a thread pool with os.scandir, each
+    directory's entries are unlinked in one batch through a directory fd,
+    and a token bucket caps unlink/rmdir operations per second so a
+    concurrent backup keeps its disk bandwidth.
+    """
+    
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        snapshots = config.get('snapshots', {})
+        self.policy = snapshots.get('retention', {
+            'keep_daily': 7, 'keep_weekly': 4, 'keep_monthly': 6
+        })
+        self.workers = max(1, int(snapshots.get('prune_workers', 4)))
+        self.throttle = TokenBucket(snapshots.get('prune_max_ops', 2000))
+        self.snapshots_dir = Path(config['local_root']) / 'snapshots'
+        self.latest = Path(config['local_root']) / 'latest'
+        self.state_dir = config.get('state_dir', 'state')
+        self.prune_failed = bool(snapshots.get('prune_failed', False))
+        
+    def _latest_name(self) -> Optional[str]:
+        """Name of the snapshot 'latest' points to"""
+        if self.latest.is_symlink():
+            return self.latest.resolve().name
+        return None
+        
+    def _resumable_runs(self) -> List[str]:
+        """Run ids of the runs that are still running or can be resumed"""
+        return [run.run_id for run in RunState.incomplete_runs(self.state_dir)]
+        
+    def plan(self) -> Dict[str, List[str]]:
+        """Snapshots to keep and to prune, without touching anything
+        
+        Only completed snapshots count towards the retention policy, and
+        'latest' itself is always kept. Incomplete snapshots are left alone
+        unless snapshots.prune_failed is set; even then only those older
+        than 'latest' and not of a resumable run are pruned.
+        """
+        if not self.snapshots_dir.exists():
+            return {'keep': [], 'prune': [], 'failed': [], 'pending': [], 'unfinished': []}
+            
+        latest = self._latest_name()
+        names = [entry.name for entry in os.scandir(self.snapshots_dir) if entry.is_dir(follow_symlinks=False)]
+        pending = sorted(name for name in names if name.startswith(DELETING_PREFIX))
+        
+        snapshots = [name for name in names
+                     if not name.startswith(DELETING_PREFIX) and snapshot_time(name)]
+        complete = [name for name in snapshots
+                    if name == latest or (self.snapshots_dir / name / COMPLETE_MARKER).exists()]
+        incomplete = [name for name in snapshots if name not in complete]
+        failed = []
+        if self.prune_failed and latest is not None:
+            resumable = self._resumable_runs()
+            failed = sorted(name for name in incomplete if name < latest and name not in resumable)
+        unfinished = sorted(name for name in incomplete if name not in failed)
+        
+        keep, prune = select_snapshots(complete, self.policy)
+        if latest in prune:
+            prune.remove(latest)
+            keep.append(latest)
+            
+        return {'keep': keep, 'prune': prune, 'failed': failed, 'pending': pending, 'unfinished': unfinished}
+        
+    def prune(self, dry_run: bool = False, log_message=print) -> Dict[str, Any]:
+        """Delete the snapshots the retention policy no longer keeps"""
+        plan = self.plan()
+        start_time = datetime.now()
+        
+        log_message(f"🗂️  Snapshots: keep {len(plan['keep'])}, prune {len(plan['prune'])}, "
+                    f"failed {len(plan['failed'])}, incomplete kept {len(plan['unfinished'])}")
+        for name in plan['prune']:
+            log_message(f"   🗑️  {name}")
+        for name in plan['failed']:
+            log_message(f"   🗑️  {name} (failed run)")
+            
+        removed = {'snapshots': 0, 'files': 0, 'dirs': 0, 'errors': 0}
+        if dry_run:
+            return {'plan': plan, 'removed': removed, 'duration': timedelta(0)}
+            
+        # Claim every doomed snapshot first, then resume earlier interrupted deletions too
+        targets = [self.snapshots_dir / name for name in plan['pending']]
+        for name in plan['prune'] + plan['failed']:
+            claimed = self.snapshots_dir / f"{DELETING_PREFIX}{name}"
+            os.rename(self.snapshots_dir / name, claimed)
+            targets.append(claimed)
+            
+        for target in targets:
+            stats = self.remove_tree(target)
+            for key in ('files', 'dirs', 'errors'):
+                removed[key] += stats[key]
+            if not target.exists():
+                removed['snapshots'] += 1
+            log_message(f"   ✅ {target.name[len(DELETING_PREFIX):]}: "
+                        f"{stats['files']:,} files, {stats['dirs']:,} dirs removed")
+                        
+        duration = datetime.now() - start_time
+        log_message(f"🧹 Pruned {removed['snapshots']} snapshots in {duration.total_seconds():.1f}s "
+                    f"({removed['errors']} errors)")
+        return {'plan': plan, 'removed': removed, 'duration': duration}
+        
+    def _clear_directory(self, path: str) -> Tuple[List[str], int, int]:
+        """Unlink every non-directory entry of one directory in a batch
+        
+        Returns the subdirectories still to process, the number of entries
+        removed and the number of failures.
+        """
+        subdirs = []
+        names = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                else:
+                    names.append(entry.name)
+                    
+        removed = errors = 0
+        if names:
+            self.throttle.consume(len(names))
+            dir_fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                for name in names:
+                    try:
+                        os.unlink(name, dir_fd=dir_fd)
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+                    except OSError:
+                        errors += 1
+            finally:
+                os.close(dir_fd)
+                
+        return subdirs, removed, errors
+        
+    def remove_tree(self, root: Path) -> Dict[str, int]:
+        """Delete a directory tree with a thread pool and throttled I/O"""
+        stats = {'files': 0, 'dirs': 0, 'errors': 0}
+        directories = []
+        
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {executor.submit(self._clear_directory, str(root)): str(root)}
+            directories.append(str(root))
+            
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    try:
+                        subdirs, removed, errors = future.result()
+                    except OSError:
+                        stats['errors'] += 1
+                        continue
+                        
+                    stats['files'] += removed
+                    stats['errors'] += errors
+                    for subdir in subdirs:
+                        directories.append(subdir)
+                        pending[executor.submit(self._clear_directory, subdir)] = subdir
+                        
+        # Children before parents: deepest paths first
+        directories.sort(key=lambda path: path.count(os.sep), reverse=True)
+        for path in directories:
+            self.throttle.consume()
+            try:
+                os.rmdir(path)
+                stats['dirs'] += 1
+            except OSError:
+                stats['errors'] += 1
+                
+        return stats
@@ -0,0 +1,89 @@
+"""
+Retry backoff and circuit breaker for transfers
+"""
+
+import random
+import threading
+import time
+from typing import Callable
+
+# rsync/ssh exit codes meaning the connection to the host failed, not the files:
+# socket I/O, protocol stream, I/O timeout, connect timeout, ssh error
+CONNECTION_EXIT_CODES = {10, 12, 30, 35, 255}
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with jitter for the given retry attempt (0-based)
+    
+    Half of the delay is fixed and half random, so chunks that failed
+    together do not all come back at the same moment.
+    """
+    delay = min(cap, base * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+class CircuitBreaker:
+    """Tạm dừng mọi worker khi không kết nối được tới host
+    
+    Transfers report whether they reached the host. After `threshold`
+    connection failures in a row the circuit opens: a probe thread checks
+    the host with a cheap SSH command, with growing intervals, and every
+    worker calling wait() blocks until a probe succeeds. Retries are not
+    burned while the network is down. After max_outage seconds the
+    circuit closes anyway so a dead host ends the run instead of hanging it.
+    """
+    
+    def __init__(self, probe: Callable[[], bool], threshold: int = 3,
+                 probe_interval: float = 15, max_probe_interval: float = 300,
+                 max_outage: float = 3600, log: Callable[[str], None] = print):
+        self.probe = probe
+        self.threshold = max(1, threshold)
+        self.probe_interval = probe_interval
+        self.max_probe_interval = max_probe_interval
+        self.max_outage = max_outage
+        self.log = log
+        self.failures = 0
+        self._closed = threading.Event()
+        self._closed.set()
+        self._lock = threading.Lock()
+        
+    @property
+    def is_open(self) -> bool:
+        return not self._closed.is_set()
+        
+    def record(self, connected: bool):
+        """Report whether a transfer attempt reached the host"""
+        with self._lock:
+            if connected:
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.failures < self.threshold or self.is_open:
+                return
+            self._closed.clear()
+            
+        self.log(f"🔌 {self.failures} connection failures in a row, pausing all workers until the host answers")
+        threading.Thread(target=self._probe_loop, daemon=True).start()
+        
+    def wait(self):
+        """Block while the circuit is open"""
+        self._closed.wait()
+        
+    def cancel(self):
+        """Let every waiting worker through, e.g. when the run is stopped"""
+        self._closed.set()
+        
+    def _probe_loop(self):
+        opened = time.monotonic()
+        interval = self.probe_interval
+        while True:
+            if self.probe():
+                self.log(f"🔌 Host reachable again after {time.monotonic() - opened:.0f}s, resuming workers")
+                break
+            if time.monotonic() - opened >= self.max_outage:
+                self.log(f"🔌 Host still unreachable after {self.max_outage:.0f}s, resuming workers anyway")
+                break
+            time.sleep(interval)
+            interval = min(self.max_probe_interval, interval * 2)
+            
+        with self._lock:
+            self.failures = 0
+            self._closed.set()
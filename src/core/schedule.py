@@ -0,0 +1,106 @@
+"""
+Time-of-day bandwidth and concurrency schedules
+"""
+
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from .config import parse_rate
+
+DAY_NAMES = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+def parse_clock(value: Any) -> int:
+    """Minutes after midnight of a 'HH:MM' value
+    
+    YAML reads an unquoted 18:00 as the base-60 integer 1080, which is
+    already the number of minutes.
+    """
+    if isinstance(value, int):
+        return value % (24 * 60)
+    hours, _, minutes = str(value).strip().partition(':')
+    return (int(hours) * 60 + int(minutes or 0)) % (24 * 60)
+
+class TransferSchedule:
+    """Giới hạn băng thông và số worker theo khung giờ
+    
+    Windows are checked in order and the first one containing the current
+    time applies; outside all windows the default settings apply. A window
+    may wrap around midnight (22:00-06:00) and may be limited to some days.
+    """
+    
+    def __init__(self, config: Dict[str, Any]):
+        schedule = config.get('schedule', {})
+        self.enabled = bool(schedule.get('enable', False))
+        self.interval = schedule.get('check_interval', 60)
+        
+        default = schedule.get('default', {})
+        self.default = {
+            'name': 'default',
+            'bwlimit': parse_rate(default.get('bwlimit', config.get('bwlimit', 0))),
+            'workers': max(1, int(default.get('workers', config.get('threads', 4))))
+        }
+        
+        self.windows = []
+        for window in schedule.get('windows', []) or []:
+            days = window.get('days')
+            start, end = parse_clock(window['start']), parse_clock(window['end'])
+            self.windows.append({
+                'name': f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}",
+                'start': start,
+                'end': end,
+                'days': {DAY_NAMES.index(day.lower()[:3]) for day in days} if days else None,
+                'bwlimit': parse_rate(window.get('bwlimit', 0)),
+                'workers': max(1, int(window.get('workers', self.default['workers'])))
+            })
+            
+    def _contains(self, window: Dict[str, Any], now: datetime) -> bool:
+        """Check whether a window covers the given moment"""
+        if window['days'] is not None and now.weekday() not in window['days']:
+            return False
+        minute = now.hour * 60 + now.minute
+        if window['start'] <= window['end']:
+            return window['start'] <= minute < window['end']
+        return minute >= window['start'] or minute < window['end']
+        
+    def current(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Settings (name, bwlimit bytes/s, workers) in effect at a moment"""
+        now = now or datetime.now()
+        for window in self.windows:
+            if self._contains(window, now):
+                return window
+        return self.default
+        
+    def max_workers(self) -> int:
+        """Largest worker count any window asks for"""
+        return max([self.default['workers']] + [window['workers'] for window in self.windows])
+
+class WorkerGate:
+    """Concurrency limit for transfer workers that can be changed while they run
+    
+    Lowering the limit never interrupts a transfer: workers above the new
+    limit finish their current batch and then wait at the gate.
+    """
+    
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.active = 0
+        self._cond = threading.Condition()
+        
+    def set_limit(self, limit: int):
+        """Change the number of transfers allowed at once"""
+        with self._cond:
+            self.limit = max(1, limit)
+            self._cond.notify_all()
+            
+    def __enter__(self):
+        with self._cond:
+            while self.active >= self.limit:
+                self._cond.wait()
+            self.active += 1
+        return self
+        
+    def __exit__(self, *exc_info):
+        with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
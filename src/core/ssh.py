@@ -2,31 +2,196 @@
 SSH connection and testing utilities
 """
 
+import atexit
+import math
+import shlex
+import shutil
 import subprocess
+import tempfile
+import threading
 import time
 from pathlib import Path
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, List, Tuple
+
+from .schedule import TransferSchedule
+
+# Remote compressor and local decompressor for streamed command output
+STREAM_COMPRESSORS = {
+    'gzip': ('gzip -1 -c', ['gzip', '-d', '-c']),
+    'zstd': ('zstd -1 -q -c', ['zstd', '-d', '-q', '-c']),
+}
+
+# Sessions multiplexed over one master, below sshd's MaxSessions default of 10
+SESSIONS_PER_MASTER = 8
+
+def peak_sessions(config: Dict[str, Any]) -> int:
+    """Most ssh sessions a run can have open at once
+    
+    Every worker holds one session, and the largest worker count is the
+    most the schedule or the autotuner may reach. Range transfers run
+    beside the workers with `streams` sessions each, at most
+    large_files.concurrent_files of them, and the parallel finds of a
+    pipeline listing run alongside as well.
+    """
+    workers = int(config.get('threads', 4))
+    schedule = TransferSchedule(config)
+    if schedule.enabled:
+        workers = max(workers, schedule.max_workers())
+    autotune = config.get('autotune', {})
+    if autotune.get('enable', False):
+        workers = max(workers, int(autotune.get('max_workers', 32)))
+        
+    sessions = workers + max(1, int(config.get('listing', {}).get('parallel', 1)))
+    large_files = config.get('large_files', {})
+    if large_files.get('enable', False):
+        streams = max(1, int(large_files.get('streams', 8)))
+        sessions += max(1, int(large_files.get('concurrent_files', 2))) * streams
+    return sessions
+
+class SSHConnectionPool:
+    """Pool of persistent OpenSSH master connections (ControlMaster)
+    
+    Every ssh and rsync invocation is multiplexed over one of `size` master
+    sockets, so only the masters pay for key exchange and authentication.
+    Clients use ControlMaster=auto, which means a dead master is transparently
+    re-created by the next client; health_check() does the same eagerly.
+    By default the pool gets one master per SESSIONS_PER_MASTER sessions
+    at the run's peak concurrency.
+    """
+    
+    def __init__(self, config: Dict[str, Any], ssh_options: List[str], target: str):
+        pool_config = config.get('ssh_pool', {})
+        self.enabled = pool_config.get('enable', True)
+        size = pool_config.get('size', 'auto')
+        if size in (None, 'auto'):
+            size = math.ceil(peak_sessions(config) / SESSIONS_PER_MASTER)
+        self.size = max(1, int(size))
+        self.persist = int(pool_config.get('persist', 600))
+        self.configured_dir = pool_config.get('control_dir')
+        self.ssh_options = ssh_options
+        self.target = target
+        self.control_dir = None
+        self._lock = threading.Lock()
+        
+    def _ensure_control_dir(self) -> str:
+        """Create the private directory holding the control sockets"""
+        if self.control_dir is None:
+            if self.configured_dir:
+                path = Path(self.configured_dir).expanduser()
+                path.mkdir(mode=0o700, parents=True, exist_ok=True)
+                self.control_dir = str(path)
+            else:
+                # Short path: unix socket paths are limited to ~104 bytes
+                self.control_dir = tempfile.mkdtemp(prefix='vpsb-ssh-')
+            atexit.register(self._cleanup)
+        return self.control_dir
+        
+    def control_options(self, slot: int = 0) -> List[str]:
+        """SSH options that route a client through the given master"""
+        if not self.enabled:
+            return []
+            
+        control_path = Path(self._ensure_control_dir()) / f'{slot % self.size}-%C'
+        return [
+            '-o', 'ControlMaster=auto',
+            '-o', f'ControlPath={control_path}',
+            '-o', f'ControlPersist={self.persist}'
+        ]
+        
+    def _control(self, slot: int, operation: str, timeout: int = 15) -> bool:
+        """Send a control command (check, exit) to a master"""
+        cmd = ['ssh'] + self.control_options(slot) + ['-O', operation, self.target]
+        try:
+            result = subprocess.run(cmd, capture_output=True, timeout=timeout)
+            return result.returncode == 0
+        except (subprocess.TimeoutExpired, OSError):
+            return False
+            
+    def _open_master(self, slot: int, timeout: int = 60) -> bool:
+        """Start a backgrounded master connection for a slot"""
+        cmd = (['ssh'] + self.ssh_options + self.control_options(slot) +
+               ['-N', '-f', self.target])
+        try:
+            result = subprocess.run(cmd, capture_output=True, timeout=timeout)
+            return result.returncode == 0
+        except (subprocess.TimeoutExpired, OSError):
+            return False
+            
+    def start(self) -> int:
+        """Open all master connections, return number of live masters"""
+        if not self.enabled:
+            return 0
+            
+        with self._lock:
+            return sum(
+                1 for slot in range(self.size)
+                if self._control(slot, 'check') or self._open_master(slot)
+            )
+            
+    def health_check(self) -> Dict[int, bool]:
+        """Check every master and reconnect the ones that died"""
+        status = {}
+        if not self.enabled:
+            return status
+            
+        with self._lock:
+            for slot in range(self.size):
+                if self._control(slot, 'check'):
+                    status[slot] = True
+                else:
+                    # Drop a stale socket before opening a new master
+                    self._control(slot, 'exit')
+                    status[slot] = self._open_master(slot)
+        return status
+        
+    def stop(self):
+        """Close all master connections"""
+        with self._lock:
+            if self.control_dir is None:
+                return
+                
+            for slot in range(self.size):
+                self._control(slot, 'exit')
+                
+    def _cleanup(self):
+        """Close masters and remove the private socket directory on exit"""
+        self.stop()
+        if self.control_dir and not self.configured_dir:
+            shutil.rmtree(self.control_dir, ignore_errors=True)
 
 class SSHManager:
     """Quản lý kết nối SSH và các thao tác remote"""
     
     def __init__(self, config: Dict[str, Any]):
         self.config = config
+        self.target = f"{self.config['ssh_user']}@{self.config['ssh_host']}"
+        self.pool = SSHConnectionPool(config, self._build_ssh_options(), self.target)
         self.ssh_base_cmd = self._build_ssh_command()
         
-    def _build_ssh_command(self) -> list:
-        """Build base SSH command"""
+    def _build_ssh_options(self) -> list:
+        """Build SSH authentication and connection options"""
         return [
-            'ssh',
             '-i', str(Path(self.config['ssh_key']).expanduser()),
             '-p', str(self.config.get('ssh_port', 22)),
             '-o', 'ConnectTimeout=30',
             '-o', 'ServerAliveInterval=60',
             '-o', 'ServerAliveCountMax=3',
             '-o', 'BatchMode=yes',  # Non-interactive mode
-            f"{self.config['ssh_user']}@{self.config['ssh_host']}"
         ]
         
+    def _build_ssh_command(self, slot: int = 0) -> list:
+        """Build base SSH command"""
+        return (['ssh'] + self._build_ssh_options() +
+                self.pool.control_options(slot) + [self.target])
+                
+    def ssh_command(self, slot: int = 0) -> list:
+        """SSH command multiplexed over the given pool slot"""
+        return self._build_ssh_command(slot)
+        
+    def rsync_ssh_command(self, slot: int = 0) -> str:
+        """SSH command string for rsync -e, sharing the pool masters"""
+        return shlex.join(['ssh'] + self._build_ssh_options() + self.pool.control_options(slot))
+        
     def test_connection(self, timeout: int = 15) -> Tuple[bool, str]:
         """Test SSH connection"""
         try:
@@ -75,6 +240,83 @@ class SSHManager:
         except Exception as e:
             return False, "", f"Command error: {str(e)}"
             
+    def stream_command(self, command: str, output_path: str, timeout: int = 3600,
+                       compression: str = 'none', slot: int = 0) -> Tuple[bool, str]:
+        """Run remote command via SSH and stream its stdout straight into a file
+        
+        The output never passes through Python: ssh (or the local decompressor)
+        writes directly into output_path, so memory stays flat regardless of
+        how much the command prints. With compression set to 'gzip' or 'zstd'
+        the stream is compressed on the remote side and decompressed locally,
+        and the command's own exit status is carried out past the compressor.
+        """
+        ssh_cmd = self.ssh_command(slot)
+        remote_cmd = command
+        decompress_cmd = None
+        
+        if compression and compression != 'none':
+            if compression not in STREAM_COMPRESSORS:
+                return False, f"Unsupported stream compression: {compression}"
+            remote_suffix, decompress_cmd = STREAM_COMPRESSORS[compression]
+            # A pipeline exits with the compressor's status, so the command
+            # reports its own through fd 3 and the shell exits with that
+            script = (f"exec 4>&1; status=$({{ {{ {command}; echo $? >&3; }} | {remote_suffix} >&4; }} 3>&1); "
+                      f"exit ${{status:-1}}")
+            remote_cmd = f"sh -c {shlex.quote(script)}"
+            
+        procs = []
+        stderr_file = tempfile.TemporaryFile()
+        
+        try:
+            with open(output_path, 'wb') as out:
+                if decompress_cmd:
+                    ssh_proc = subprocess.Popen(
+                        ssh_cmd + [remote_cmd],
+                        stdout=subprocess.PIPE,
+                        stderr=stderr_file
+                    )
+                    procs.append(ssh_proc)
+                    procs.append(subprocess.Popen(
+                        decompress_cmd,
+                        stdin=ssh_proc.stdout,
+                        stdout=out,
+                        stderr=stderr_file
+                    ))
+                    # The decompressor owns the pipe now
+                    ssh_proc.stdout.close()
+                else:
+                    procs.append(subprocess.Popen(
+                        ssh_cmd + [remote_cmd],
+                        stdout=out,
+                        stderr=stderr_file
+                    ))
+                    
+                deadline = time.time() + timeout
+                for proc in procs:
+                    proc.wait(timeout=max(0, deadline - time.time()))
+                    
+            success = all(proc.returncode == 0 for proc in procs)
+            return success, self._read_stderr_tail(stderr_file)
+            
+        except subprocess.TimeoutExpired:
+            return False, "Command timeout"
+        except FileNotFoundError as e:
+            return False, f"Command not found: {e.filename}"
+        except Exception as e:
+            return False, f"Command error: {str(e)}"
+        finally:
+            for proc in procs:
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+            stderr_file.close()
+            
+    def _read_stderr_tail(self, stderr_file, limit: int = 4096) -> str:
+        """Read the last bytes of a captured stderr file"""
+        size = stderr_file.seek(0, 2)
+        stderr_file.seek(max(0, size - limit))
+        return stderr_file.read().decode('utf-8', errors='replace').strip()
+            
     def check_remote_path(self, path: str) -> Tuple[bool, str]:
         """Check if remote path exists"""
         success, stdout, stderr = self.run_command(
@@ -113,7 +355,7 @@ class SSHManager:
     def test_rsync_connection(self) -> Tuple[bool, str]:
         """Test rsync connection by doing a dry run"""
         try:
-            ssh_cmd = f"ssh -i {Path(self.config['ssh_key']).expanduser()} -p {self.config.get('ssh_port', 22)}"
+            ssh_cmd = self.rsync_ssh_command()
             
             # Create a temporary test file on remote
             test_file = '/tmp/backup_test_file'
@@ -162,6 +404,11 @@ class NetworkInterfaceMonitor:
         if not success or not output:
             return None
             
+        return self.parse_net_dev(output)
+        
+    @staticmethod
+    def parse_net_dev(output: str) -> Dict[str, Dict[str, int]]:
+        """Parse /proc/net/dev content into per-interface counters"""
         stats = {}
         lines = output.split('\n')
         
@@ -201,6 +448,15 @@ class NetworkInterfaceMonitor:
         if not stats2:
             return None
             
+        return self.compute_bandwidth(stats1, stats2, interval)
+        
+    @staticmethod
+    def compute_bandwidth(stats1: Dict[str, Dict[str, int]], stats2: Dict[str, Dict[str, int]],
+                          interval: float) -> Optional[Dict[str, Any]]:
+        """Calculate bandwidth usage between two counter snapshots"""
+        if interval <= 0:
+            return None
+            
         interfaces_data = {}
         total_download = 0
         total_upload = 0
@@ -247,6 +503,10 @@ class NetworkInterfaceMonitor:
             
         return None
         
+    def open_stream(self, sample_interval: float = 1.0) -> 'NetworkStatsStream':
+        """Open a persistent sampler streaming /proc/net/dev snapshots"""
+        return NetworkStatsStream(self.ssh, sample_interval)
+        
     def test_interfaces(self) -> Dict[str, Any]:
         """Test and get information about network interfaces"""
         result = {
@@ -274,3 +534,95 @@ class NetworkInterfaceMonitor:
             result['error'] = str(e)
             
         return result
+
+class NetworkStatsStream:
+    """Stream timestamped /proc/net/dev snapshots over a single SSH session
+    
+    One long-lived remote loop prints the remote uptime followed by
+    /proc/net/dev every sample_interval seconds. Rates are computed from the
+    remote clock, so SSH latency does not skew them, and no new connection
+    is opened per sample.
+    """
+    
+    SNAPSHOT_START = '@@'
+    SNAPSHOT_END = '@@END'
+    
+    def __init__(self, ssh_manager: SSHManager, sample_interval: float = 1.0):
+        self.ssh = ssh_manager
+        self.sample_interval = sample_interval
+        self.process = None
+        self.thread = None
+        self._samples = []
+        self._lock = threading.Lock()
+        
+    def _remote_loop(self) -> str:
+        """Shell loop emitting one snapshot per sample interval"""
+        return (
+            'while :; do '
+            'read up idle < /proc/uptime; '
+            f'echo "{self.SNAPSHOT_START} $up"; '
+            'cat /proc/net/dev; '
+            f'echo "{self.SNAPSHOT_END}"; '
+            f'sleep {self.sample_interval}; '
+            'done'
+        )
+        
+    def start(self):
+        """Start the remote loop and the local reader thread"""
+        if self.is_alive():
+            return
+            
+        self.process = subprocess.Popen(
+            self.ssh.ssh_base_cmd + [self._remote_loop()],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True
+        )
+        self.thread = threading.Thread(target=self._read_loop, daemon=True)
+        self.thread.start()
+        
+    def is_alive(self) -> bool:
+        """Check whether the remote loop is still running"""
+        return self.process is not None and self.process.poll() is None
+        
+    def _read_loop(self):
+        """Parse snapshots from the remote loop as they arrive"""
+        uptime = None
+        lines = []
+        
+        for line in self.process.stdout:
+            line = line.rstrip('\n')
+            
+            if line == self.SNAPSHOT_END:
+                if uptime is not None:
+                    stats = NetworkInterfaceMonitor.parse_net_dev('\n'.join(lines))
+                    with self._lock:
+                        self._samples.append((uptime, stats))
+                uptime = None
+                lines = []
+            elif line.startswith(self.SNAPSHOT_START + ' '):
+                try:
+                    uptime = float(line.split()[1])
+                except (IndexError, ValueError):
+                    uptime = None
+                lines = []
+            else:
+                lines.append(line)
+                
+    def drain(self) -> List[Tuple[float, Dict[str, Dict[str, int]]]]:
+        """Return (remote uptime, counters) snapshots received since last call"""
+        with self._lock:
+            samples = self._samples
+            self._samples = []
+        return samples
+        
+    def stop(self):
+        """Stop the remote loop"""
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.thread:
+            self.thread.join(timeout=5)
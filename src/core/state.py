@@ -0,0 +1,208 @@
+"""
+Run state persistence for resumable backups
+"""
+
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+class RunState:
+    """On-disk state of one backup run
+    
+    Each run owns a directory under <state_dir>/runs holding the listing,
+    the chunk files, the chunk plan (state.json), an append-only log of
+    chunk results and the per-file completion journal. An interrupted or
+    failed run can be picked up again from there. Pipeline runs append
+    their chunks to a plan log as they are created instead.
+    """
+    
+    STATE_FILE = 'state.json'
+    CHUNK_LOG = 'chunks.log'
+    PLAN_LOG = 'plan.log'
+    
+    def __init__(self, run_dir: Path, data: Dict[str, Any]):
+        self.run_dir = Path(run_dir)
+        self.data = data
+        
+    @classmethod
+    def runs_dir(cls, state_dir: str) -> Path:
+        """Directory holding all run directories"""
+        return Path(state_dir) / 'runs'
+        
+    @classmethod
+    def create(cls, state_dir: str, backup_type: str) -> 'RunState':
+        """Create the state directory of a new run"""
+        runs_dir = cls.runs_dir(state_dir)
+        run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+        suffix = 1
+        while (runs_dir / run_id).exists():
+            suffix += 1
+            run_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{suffix}"
+            
+        run_dir = runs_dir / run_id
+        run_dir.mkdir(parents=True)
+        
+        state = cls(run_dir, {
+            'run_id': run_id,
+            'backup_type': backup_type,
+            'status': 'running',
+            'started': datetime.now().isoformat(),
+            'plan': None
+        })
+        state.save()
+        return state
+        
+    @classmethod
+    def load(cls, run_dir: Path) -> Optional['RunState']:
+        """Load the state of an existing run"""
+        try:
+            with open(Path(run_dir) / cls.STATE_FILE) as f:
+                return cls(run_dir, json.load(f))
+        except (OSError, ValueError):
+            return None
+            
+    @classmethod
+    def list_runs(cls, state_dir: str) -> List['RunState']:
+        """All recorded runs, oldest first"""
+        runs_dir = cls.runs_dir(state_dir)
+        if not runs_dir.exists():
+            return []
+            
+        runs = [cls.load(path) for path in sorted(runs_dir.iterdir()) if path.is_dir()]
+        return [run for run in runs if run is not None]
+        
+    @classmethod
+    def incomplete_runs(cls, state_dir: str) -> List['RunState']:
+        """Runs that can still be resumed, oldest first
+        
+        Only the newest run of each backup type counts: a later run of the
+        same type supersedes it, one of another type does not.
+        """
+        newest = {}
+        for run in cls.list_runs(state_dir):
+            newest[run.backup_type] = run
+        return sorted((run for run in newest.values() if run.status not in ('completed', 'abandoned')),
+                      key=lambda run: run.run_dir.name)
+                      
+    @classmethod
+    def latest_incomplete(cls, state_dir: str) -> Optional['RunState']:
+        """Most recent run that did not complete successfully"""
+        runs = cls.incomplete_runs(state_dir)
+        return runs[-1] if runs else None
+        
+    @classmethod
+    def cleanup(cls, state_dir: str, keep: int = 5):
+        """Remove finished runs beyond the newest `keep` ones"""
+        finished = [run for run in cls.list_runs(state_dir)
+                    if run.status in ('completed', 'abandoned')]
+        for run in finished[:max(0, len(finished) - keep)]:
+            shutil.rmtree(run.run_dir, ignore_errors=True)
+            
+    @property
+    def run_id(self) -> str:
+        return self.data['run_id']
+        
+    @property
+    def backup_type(self) -> str:
+        return self.data['backup_type']
+        
+    @property
+    def status(self) -> str:
+        return self.data.get('status', 'running')
+        
+    @property
+    def plan(self) -> Optional[Dict[str, Any]]:
+        return self.data.get('plan')
+        
+    def save(self):
+        """Write state.json atomically"""
+        tmp_path = self.run_dir / f'{self.STATE_FILE}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.run_dir / self.STATE_FILE)
+        
+    def update(self, **fields):
+        """Update top-level fields and persist them"""
+        self.data.update(fields)
+        self.save()
+        
+    def _chunk_key(self, chunk_path: str) -> str:
+        """Chunk path relative to the run directory"""
+        return os.path.relpath(chunk_path, self.run_dir)
+        
+    def save_plan(self, chunks: List[str], chunk_bytes: Dict[str, int], n_workers: int,
+                  **extra):
+        """Record the chunk plan once the listing has been partitioned"""
+        self.data['plan'] = {
+            'chunks': [self._chunk_key(chunk) for chunk in chunks],
+            'chunk_bytes': {self._chunk_key(chunk): size for chunk, size in chunk_bytes.items()},
+            'n_workers': n_workers,
+            **extra
+        }
+        self.save()
+        
+    def update_plan(self, **fields):
+        """Update fields of the saved plan and persist them"""
+        self.data['plan'].update(fields)
+        self.save()
+        
+    def add_chunk(self, chunk_path: str, size: int):
+        """Append a chunk created after the plan was saved to the plan log"""
+        with open(self.run_dir / self.PLAN_LOG, 'a') as f:
+            f.write(f"{self._chunk_key(chunk_path)}\t{size}\n")
+            f.flush()
+            os.fsync(f.fileno())
+            
+    def _logged_chunks(self) -> List[Tuple[str, int]]:
+        """Chunk keys and sizes from the plan log, in creation order"""
+        chunks = []
+        log_path = self.run_dir / self.PLAN_LOG
+        if log_path.exists():
+            with open(log_path) as f:
+                for line in f:
+                    key, _, size = line.rstrip('\n').partition('\t')
+                    if size.isdigit():
+                        chunks.append((key, int(size)))
+        return chunks
+        
+    def reset_chunks(self):
+        """Forget the plan log and chunk results before planning the run again"""
+        for name in (self.PLAN_LOG, self.CHUNK_LOG):
+            try:
+                os.unlink(self.run_dir / name)
+            except FileNotFoundError:
+                pass
+                
+    def chunk_paths(self) -> List[str]:
+        """Chunk file paths of the plan"""
+        keys = (self.plan or {}).get('chunks', []) + [key for key, _ in self._logged_chunks()]
+        return [str(self.run_dir / key) for key in keys]
+        
+    def chunk_bytes(self) -> Dict[str, int]:
+        """Expected bytes per chunk path"""
+        sizes = dict((self.plan or {}).get('chunk_bytes', {}))
+        sizes.update(self._logged_chunks())
+        return {str(self.run_dir / key): size for key, size in sizes.items()}
+        
+    def mark_chunk(self, chunk_path: str, success: bool):
+        """Append a chunk result to the chunk log"""
+        with open(self.run_dir / self.CHUNK_LOG, 'a') as f:
+            f.write(f"{self._chunk_key(chunk_path)}\t{'ok' if success else 'failed'}\n")
+            f.flush()
+            os.fsync(f.fileno())
+            
+    def chunk_results(self) -> Dict[str, bool]:
+        """Latest recorded result per chunk path"""
+        results = {}
+        log_path = self.run_dir / self.CHUNK_LOG
+        if log_path.exists():
+            with open(log_path) as f:
+                for line in f:
+                    key, _, status = line.rstrip('\n').partition('\t')
+                    results[str(self.run_dir / key)] = status == 'ok'
+        return results
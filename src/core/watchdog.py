@@ -0,0 +1,99 @@
+"""
+Progress-based stall detection and stopping of running transfers
+"""
+
+import threading
+import time
+from typing import Callable, List, Optional
+
+class TransferProcesses:
+    """Running transfer processes of a run, so a stop can kill them all at once
+    
+    Once stopped, processes added later are killed straight away and
+    workers check `stopped` before starting anything new.
+    """
+    
+    def __init__(self):
+        self.stopped = threading.Event()
+        self._processes = set()
+        self._lock = threading.Lock()
+        
+    def add(self, process):
+        """Track a process that was just started"""
+        with self._lock:
+            self._processes.add(process)
+            if not self.stopped.is_set():
+                return
+        process.kill()
+        
+    def discard(self, process):
+        """Stop tracking a process that has ended"""
+        with self._lock:
+            self._processes.discard(process)
+            
+    def stop(self):
+        """Kill every tracked process and refuse new work"""
+        with self._lock:
+            self.stopped.set()
+            processes = list(self._processes)
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+
+class StallWatchdog:
+    """Dừng một transfer khi nó không còn tiến triển
+    
+    The reader of a transfer's output calls progress() whenever output
+    arrives (rsync --progress lines, finished files). The transfer is
+    killed only when nothing moved for stall_timeout seconds, or when it
+    runs past a deadline that the caller derives from the expected bytes
+    and the throughput observed so far. A long but healthy transfer is
+    never cut off by a fixed wall-clock limit.
+    """
+    
+    def __init__(self, processes: List, stall_timeout: float,
+                 deadline: Optional[Callable[[], Optional[float]]] = None,
+                 check_interval: float = 10):
+        self.processes = processes
+        self.stall_timeout = stall_timeout
+        self.deadline = deadline
+        self.check_interval = check_interval
+        self.started = time.monotonic()
+        self.last_progress = self.started
+        self.reason = None
+        self._stop = threading.Event()
+        self._thread = None
+        
+    def progress(self):
+        """Record that the transfer just moved"""
+        self.last_progress = time.monotonic()
+        
+    def start(self):
+        """Start watching in a background thread"""
+        self._thread = threading.Thread(target=self._watch, daemon=True)
+        self._thread.start()
+        
+    def cancel(self):
+        """Stop watching"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            
+    def _watch(self):
+        while not self._stop.wait(self.check_interval):
+            now = time.monotonic()
+            idle = now - self.last_progress
+            if self.stall_timeout and idle >= self.stall_timeout:
+                self._kill(f"no progress for {idle:.0f}s")
+                return
+                
+            deadline = self.deadline() if self.deadline else None
+            if deadline and now - self.started >= deadline:
+                self._kill(f"running {now - self.started:.0f}s, past its {deadline:.0f}s deadline")
+                return
+                
+    def _kill(self, reason: str):
+        self.reason = reason
+        for process in self.processes:
+            if process.poll() is None:
+                process.kill()
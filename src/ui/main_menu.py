@@ -14,6 +14,8 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 from core.config import ConfigManager
 from core.ssh import SSHManager, NetworkInterfaceMonitor
 from core.backup import BackupEngine
+from core.state import RunState
+from core.retention import SnapshotPruner
 from utils.screen import ScreenManager
 from utils.formatting import (
     print_logo, print_header, print_section, print_table,
@@ -77,6 +79,7 @@ class BackupApplication:
         print(" 12) 🖥️  System Information")
         print(" 13) 📋 View Backup Logs")
         print(" 14) 🔍 Debug Backup Status")
+        print(" 15) 🗑️  Prune Old Snapshots")
         
         print("\n 0) 🚪 Exit")
         print("\n" + "=" * 80)
@@ -112,6 +115,8 @@ class BackupApplication:
                 self.view_backup_logs()
             elif choice == '14':
                 self.debug_backup_status()
+            elif choice == '15':
+                self.prune_snapshots()
             elif choice in ['q', 'Q', '0']:
                 return False
             else:
@@ -206,6 +211,40 @@ class BackupApplication:
             print("\n\nStopping bandwidth monitoring...")
             self.backup_engine.stop_bandwidth_monitoring()
             
+    def prune_snapshots(self):
+        """Xóa snapshot cũ theo chính sách lưu giữ"""
+        print_section("PRUNE SNAPSHOTS")
+        
+        # Dry run first so the user sees what goes
+        result = SnapshotPruner(self.config).prune(dry_run=True)
+        plan = result['plan']
+        doomed = len(plan['prune']) + len(plan['failed'])
+        if not doomed and not plan['pending']:
+            print_info("Nothing to prune")
+            return
+            
+        if not confirm_action(f"Delete {doomed} snapshots?"):
+            return
+            
+        use_screen = confirm_action("Run in screen session? (recommended for large snapshots)", True)
+        
+        if use_screen:
+            session_name = self.screen_manager.get_available_session_name("prune")
+            command = f"cd {Path(__file__).parent.parent.parent} && python -m src.core.backup_runner prune"
+            success, message = self.screen_manager.create_session(session_name, command)
+            
+            if success:
+                print_success(f"Prune started in screen session: {session_name}")
+                print_info(f"Attach with: screen -r {session_name}")
+            else:
+                print_error(f"Failed to start prune: {message}")
+        else:
+            result = SnapshotPruner(self.config).prune()
+            if result['removed']['errors']:
+                print_error(f"Prune finished with {result['removed']['errors']} errors")
+            else:
+                print_success(f"Pruned {result['removed']['snapshots']} snapshots in {format_duration(result['duration'])}")
+                
     def list_sessions(self):
         """List all screen sessions"""
         print_section("ACTIVE SCREEN SESSIONS")
@@ -510,23 +549,19 @@ class BackupApplication:
         else:
             print("  Log directory not found")
             
-        # Chunk status
+        # Chunk status of the latest runs
         print("\n📦 Chunk Status:")
-        tmp_dir = Path(self.config.get('tmp_dir', 'tmp'))
-        if tmp_dir.exists():
-            chunk_files = list(tmp_dir.glob("chunk_*.txt"))
-            if chunk_files:
-                print(f"  Found {len(chunk_files)} chunk files")
-                chunk_files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-                for chunk_file in chunk_files[:3]:  # Show latest 3
-                    stat = chunk_file.stat()
-                    modified = datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
-                    size = format_bytes(stat.st_size)
-                    print(f"    - {chunk_file.name}: {size}, modified {modified}")
-            else:
-                print("  No chunk files found")
+        runs = RunState.list_runs(self.config.get('state_dir', 'state'))
+        if runs:
+            for run in runs[-3:]:  # Show latest 3
+                chunks = run.chunk_paths()
+                done = sum(1 for ok in run.chunk_results().values() if ok)
+                print(f"  - Run {run.run_id} ({run.backup_type}): {run.status}, "
+                      f"{done}/{len(chunks)} chunks done")
+            if RunState.incomplete_runs(self.config.get('state_dir', 'state')):
+                print_info("  Resume with: python -m src.core.backup_runner resume")
         else:
-            print("  Temp directory not found")
+            print("  No backup runs recorded")
             
         # SSH connection test
         print("\n🔗 SSH Connection Test:")
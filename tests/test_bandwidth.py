@@ -0,0 +1,60 @@
+import subprocess
+import sys
+
+from src.core.bandwidth import BandwidthGovernor, BandwidthLease
+
+MB = 1024 * 1024
+
+def test_disabled_governor_is_unlimited():
+    governor = BandwidthGovernor(0)
+    assert not governor.enabled
+    assert governor.acquire().bwlimit_kbps == 0
+
+def test_share_divides_by_the_worker_limit():
+    governor = BandwidthGovernor(8 * MB, concurrency=lambda: 4)
+    leases = [governor.acquire() for _ in range(4)]
+    assert [lease.limit_bps for lease in leases] == [2 * MB] * 4
+    # Leases taken one after another never add up to more than the budget
+    assert sum(lease.limit_bps for lease in leases) == 8 * MB
+
+def test_share_divides_by_active_leases_beyond_the_limit():
+    governor = BandwidthGovernor(8 * MB, concurrency=lambda: 2)
+    for _ in range(3):
+        governor.acquire()
+    assert governor.fair_share() == int(8 * MB / 3)
+    assert governor.fair_share(extra=1) == 2 * MB
+
+def test_release_returns_the_share():
+    governor = BandwidthGovernor(4 * MB)
+    lease = governor.acquire()
+    assert governor.fair_share(extra=1) == 2 * MB
+    governor.release(lease)
+    assert governor.fair_share(extra=1) == 4 * MB
+
+def test_feedback_scales_shares():
+    measured = [16 * MB]
+    governor = BandwidthGovernor(8 * MB, measure=lambda: measured[0])
+    governor.acquire()
+    governor._apply_feedback()
+    assert governor.factor < 1
+    assert governor.fair_share() < 8 * MB
+
+def test_rebalance_updates_paced_leases_and_restarts_rsync():
+    governor = BandwidthGovernor(8 * MB, concurrency=lambda: 1, min_runtime=0)
+    paced = governor.acquire(paced=True)
+    rsync = governor.acquire()
+    process = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)'])
+    governor.attach(rsync, process)
+    try:
+        governor.set_total(64 * MB)
+        governor._rebalance()
+        assert paced.limit_bps == 32 * MB
+        assert rsync.rebalanced
+        assert process.wait(timeout=5) != 0
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+def test_bwlimit_in_kilobytes():
+    assert BandwidthLease(512).bwlimit_kbps == 1
+    assert BandwidthLease(2 * MB).bwlimit_kbps == 2048
@@ -0,0 +1,36 @@
+from src.core.filelist import FileEntry, select_within_budget
+
+def entry(path, size, mtime=0.0):
+    return FileEntry(path, size, mtime)
+
+def test_select_within_budget_recent():
+    entries = [entry('a', 40, 1), entry('b', 40, 3), entry('c', 40, 2)]
+    selected = select_within_budget(lambda: entries, 80)
+    assert [e.path for e in selected] == ['b', 'c']
+
+def test_select_within_budget_smallest():
+    entries = [entry('big', 70), entry('small', 10), entry('mid', 30)]
+    selected = select_within_budget(lambda: entries, 50, order='smallest')
+    assert [e.path for e in selected] == ['small', 'mid']
+
+def test_select_within_budget_priority():
+    entries = [entry('other/a', 30, 9), entry('db/b', 30, 1), entry('www/c', 30, 5), entry('db/d', 30, 2)]
+    selected = select_within_budget(lambda: entries, 90, order='priority', priority_paths=['/db/', 'www'])
+    assert [e.path for e in selected] == ['db/d', 'db/b', 'www/c']
+
+def test_select_within_budget_skips_oversized():
+    entries = [entry('huge', 500, 9), entry('fits', 10, 1)]
+    assert [e.path for e in select_within_budget(lambda: entries, 100)] == ['fits']
+    assert select_within_budget(lambda: [], 100) == []
+
+def test_select_within_budget_fills_around_a_large_entry():
+    # Greedy by recency: A fits, B no longer does, C still fits
+    entries = [entry('C', 4, 1), entry('B', 5, 2), entry('A', 6, 3)]
+    selected = select_within_budget(lambda: entries, 10)
+    assert [e.path for e in selected] == ['A', 'C']
+
+def test_select_within_budget_keeps_entries_a_better_one_cannot_replace():
+    # D beats B but not C, and dropping B alone leaves no room for it
+    entries = [entry('B', 4, 2), entry('C', 4, 10), entry('D', 7, 5)]
+    selected = select_within_budget(lambda: entries, 8)
+    assert [e.path for e in selected] == ['C', 'B']
@@ -0,0 +1,49 @@
+import io
+from types import SimpleNamespace
+
+from src.core.backup import BackupEngine
+from src.core.filelist import FileEntry, open_records, write_listing_record
+
+REMOTE_ROOT = '/srv/'
+
+def partition(tmp_path, sizes, n_chunks, chunking):
+    """Partition a listing of name -> size into n_chunks, return (chunks, loads, lanes)"""
+    listing = tmp_path / 'all_files.txt'
+    with open_records(listing, 'w') as f:
+        for name, size in sizes.items():
+            write_listing_record(f, FileEntry(name, size, 0.0), REMOTE_ROOT)
+            
+    writers = [io.StringIO() for _ in range(n_chunks)]
+    engine = SimpleNamespace(config={'remote_root': REMOTE_ROOT})
+    loads, lanes = BackupEngine._partition_by_size(engine, str(listing), writers, chunking)
+    chunks = [sorted(filter(None, writer.getvalue().split('\0'))) for writer in writers]
+    return chunks, loads, lanes
+
+def test_large_files_are_spread_largest_first(tmp_path):
+    sizes = {'a': 900, 'b': 800, 'c': 500, 'd': 400, 'e': 300}
+    chunks, loads, lanes = partition(tmp_path, sizes, 2, {'sort_threshold': 100})
+    assert loads == [1600, 1300]
+    assert chunks == [['a', 'd', 'e'], ['b', 'c']]
+    assert lanes == []
+
+def test_small_files_fill_the_lightest_chunk(tmp_path):
+    sizes = {'big': 1000, 's1': 10, 's2': 10, 's3': 10}
+    chunks, loads, _ = partition(tmp_path, sizes, 2, {'sort_threshold': 100})
+    assert chunks == [['big'], ['s1', 's2', 's3']]
+    assert loads == [1000, 30]
+
+def test_dedicated_lanes_leave_the_chunks(tmp_path):
+    sizes = {'huge': 5000, 'big': 1000, 'small': 10}
+    chunks, loads, lanes = partition(tmp_path, sizes, 2,
+                                     {'sort_threshold': 100, 'dedicated_lane_threshold': 4000})
+    assert lanes == [('huge', 5000)]
+    assert sorted(sum(chunks, [])) == ['big', 'small']
+    assert sum(loads) == 1010
+
+def test_every_file_lands_in_exactly_one_place(tmp_path):
+    # A lane threshold below the sort threshold must not list a file twice
+    sizes = {'lane': 300, 'sorted': 2000, 'tail': 50}
+    chunks, _, lanes = partition(tmp_path, sizes, 3,
+                                 {'sort_threshold': 1000, 'dedicated_lane_threshold': 200})
+    placed = sum(chunks, []) + [path for path, _ in lanes]
+    assert sorted(placed) == ['lane', 'sorted', 'tail']
@@ -0,0 +1,29 @@
+import pytest
+
+from src.core.config import parse_rate, parse_size
+
+def test_parse_size_units():
+    assert parse_size('512KB') == 512 * 1024
+    assert parse_size('1.5M') == int(1.5 * 1024 ** 2)
+    assert parse_size('1 GiB') == parse_size('1GB') == 1024 ** 3
+    assert parse_size(4096) == 4096
+
+def test_parse_size_unlimited():
+    assert parse_size(None) == 0
+    assert parse_size('unlimited') == 0
+    assert parse_size('') == 0
+
+@pytest.mark.parametrize('value', ['50 gigs', 'GB', '1XB', '1..2G'])
+def test_parse_size_rejects_typos(value):
+    with pytest.raises(ValueError):
+        parse_size(value)
+
+def test_parse_rate_unitless_is_kbps():
+    assert parse_rate(1000) == parse_rate('1000') == parse_rate(' 1000 ') == 1000 * 1024
+    assert parse_rate('1000/s') == 1000 * 1024
+
+def test_parse_rate_units():
+    assert parse_rate('20MB/s') == 20 * 1024 ** 2
+    assert parse_rate('512KB') == 512 * 1024
+    assert parse_rate(None) == 0
+    assert parse_rate('unlimited') == 0
@@ -0,0 +1,51 @@
+import os
+import subprocess
+
+from src.core.filelist import build_filter_expressions, build_find_command
+
+def run_find(command):
+    """Run a listing command locally and return the listed relative paths"""
+    output = subprocess.run(['sh', '-c', command], capture_output=True, check=True).stdout
+    return sorted(record.split(b'\t', 3)[3].decode() for record in output.split(b'\0') if record)
+
+def make_tree(root, paths):
+    for path in paths:
+        target = root / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text('x')
+
+def test_filter_expressions_prune_directories():
+    prune, file_filter = build_filter_expressions(['node_modules/*', 'cache/'])
+    assert prune == "-mindepth 1 -type d \\( -name node_modules -o -name cache \\) -prune -o "
+    assert file_filter == ''
+
+def test_filter_expressions_files_and_paths():
+    prune, file_filter = build_filter_expressions(['*.log', 'var/tmp/*.swp'], ['*.conf'])
+    assert prune == ''
+    assert file_filter == ("! \\( -name '*.log' -o -path '*/var/tmp/*.swp' \\) "
+                           "\\( -name '*.conf' \\) ")
+
+def test_filter_expressions_empty():
+    assert build_filter_expressions() == ('', '')
+
+def test_find_command_excludes(tmp_path):
+    root = str(tmp_path) + '/'
+    make_tree(tmp_path, ['a.txt', 'app.log', 'node_modules/x.js', 'src/node_modules/y.js',
+                         'var/tmp/e.swp', 'b/e.swp', 'with space/c.txt'])
+    command = build_find_command(root, exclude_patterns=['node_modules/*', '*.log', 'var/tmp/*.swp'])
+    paths = [os.path.relpath(path, tmp_path) for path in run_find(command)]
+    assert sorted(paths) == ['a.txt', 'b/e.swp', 'with space/c.txt']
+
+def test_find_command_include_and_depth(tmp_path):
+    make_tree(tmp_path, ['a.conf', 'b.txt', 'sub/c.conf', 'sub/deep/d.conf'])
+    command = build_find_command(str(tmp_path), include_patterns=['*.conf'], max_depth=2)
+    paths = [os.path.relpath(path, tmp_path) for path in run_find(command)]
+    assert sorted(paths) == ['a.conf', 'sub/c.conf']
+
+def test_find_command_since(tmp_path):
+    make_tree(tmp_path, ['old.txt', 'new.txt'])
+    os.utime(tmp_path / 'old.txt', (1000000000, 1000000000))
+    command = build_find_command(str(tmp_path), since=1500000000)
+    # ctime of old.txt is now, so it still counts as changed
+    assert len(run_find(command)) == 2
+    assert "-newermt @1500000000 -o -newerct @1500000000" in command
@@ -0,0 +1,104 @@
+from src.core.filelist import decode_path, iter_records
+from src.core.journal import (
+    FILE_DENIED, FILE_ERROR, FILE_VANISHED, CompletionJournal, parse_done_record, parse_error_line,
+    parse_tar_error_line
+)
+
+def write_chunk(tmp_path, paths):
+    chunk = tmp_path / 'chunk_1.txt'
+    chunk.write_bytes(b''.join(path.encode('utf-8', 'surrogateescape') + b'\0' for path in paths))
+    return str(chunk)
+
+def read_list(path):
+    return [decode_path(record) for record in iter_records(path) if record]
+
+def test_done_record():
+    assert parse_done_record('@done >f+++++++++ 1024 home/a.txt\n') == ('home/a.txt', 1024)
+    assert parse_done_record('@done >f..t...... 0 with space/b c') == ('with space/b c', 0)
+
+def test_done_record_up_to_date_files():
+    # -ii logs unchanged files with spaces in place of the attribute dots
+    assert parse_done_record('@done .f          0 home/same.txt') == ('home/same.txt', 0)
+    assert parse_done_record('@done hf          0 home/linked') == ('home/linked', 0)
+    assert parse_done_record('@done *deleting   0 home/old') is None
+
+def test_done_record_unescapes_raw_bytes():
+    path, _ = parse_done_record('@done >f+++++++++ 5 new\\#012line latin\\#351')
+    assert path.encode('utf-8', 'surrogateescape') == b'new\nline latin\xe9'
+
+def test_done_record_ignores_other_lines():
+    assert parse_done_record('@done cd+++++++++ 0 home/dir/') is None
+    assert parse_done_record('sent 1,024 bytes  received 35 bytes') is None
+    assert parse_done_record('home/a.txt') is None
+
+def test_pending_list_untouched_chunk(tmp_path):
+    chunk = write_chunk(tmp_path, ['a', 'b'])
+    journal = CompletionJournal(str(tmp_path / 'journal'))
+    assert journal.pending_list(chunk) == (chunk, 2)
+
+def test_pending_list_skips_journaled_files(tmp_path):
+    odd = decode_path(b'new\nline \xe9')
+    chunk = write_chunk(tmp_path, ['a', odd, 'c', 'd'])
+    journal = CompletionJournal(str(tmp_path / 'journal'))
+    with journal.open_writer(chunk) as writer:
+        writer.add('a')
+        writer.add(odd)
+    with journal.open_writer(chunk) as writer:
+        writer.add('d')
+        
+    pending, remaining = journal.pending_list(chunk)
+    assert remaining == 1
+    assert read_list(pending) == ['c']
+
+def test_pending_list_skip_argument(tmp_path):
+    chunk = write_chunk(tmp_path, ['a', 'b', 'c'])
+    journal = CompletionJournal(str(tmp_path / 'journal'))
+    pending, remaining = journal.pending_list(chunk, skip=['b'])
+    assert (read_list(pending), remaining) == (['a', 'c'], 2)
+
+def test_pending_list_all_done(tmp_path):
+    chunk = write_chunk(tmp_path, ['a'])
+    journal = CompletionJournal(str(tmp_path / 'journal'))
+    with journal.open_writer(chunk) as writer:
+        writer.add('a')
+    assert journal.pending_list(chunk)[1] == 0
+
+def test_error_line_vanished():
+    assert parse_error_line('file has vanished: "/home/a/tmp.swp"\n', '/home/') == \
+        (FILE_VANISHED, 'a/tmp.swp', 'file has vanished')
+    assert parse_error_line('rsync: link_stat "/home/a/b" failed: No such file or directory (2)', '/home') == \
+        (FILE_VANISHED, 'a/b', 'No such file or directory (2)')
+
+def test_error_line_denied():
+    line = 'rsync: [sender] send_files failed to open "/home/a/key": Permission denied (13)'
+    assert parse_error_line(line, '/home') == (FILE_DENIED, 'a/key', 'Permission denied (13)')
+
+def test_error_line_other_errors():
+    line = 'rsync: [sender] read errors mapping "/home/a/disk.img": Input/output error (5)'
+    assert parse_error_line(line, '/home') == (FILE_ERROR, 'a/disk.img', 'Input/output error (5)')
+
+def test_error_line_ignores_other_lines():
+    assert parse_error_line('rsync error: some files/attrs were not transferred (code 23)', '/home') is None
+    assert parse_error_line('@done >f+++++++++ 10 a.txt', '/home') is None
+
+def test_file_errors_keep_the_latest_per_path(tmp_path):
+    chunk = write_chunk(tmp_path, ['a', 'tab\there'])
+    journal = CompletionJournal(str(tmp_path / 'journal'))
+    assert journal.file_errors(chunk) == {}
+    
+    journal.record_errors(chunk, {'a': (FILE_ERROR, 'Input/output error (5)')})
+    journal.record_errors(chunk, {'a': (FILE_VANISHED, 'file has vanished'),
+                                  'tab\there': (FILE_DENIED, 'Permission denied (13)')})
+    assert journal.file_errors(chunk) == {
+        'a': (FILE_VANISHED, 'file has vanished'),
+        'tab\there': (FILE_DENIED, 'Permission denied (13)'),
+    }
+
+def test_tar_error_line():
+    assert parse_tar_error_line('tar: a/gone.txt: Warning: Cannot stat: No such file or directory\n') == \
+        (FILE_VANISHED, 'a/gone.txt', 'No such file or directory')
+    assert parse_tar_error_line('tar: a/key: Cannot open: Permission denied') == \
+        (FILE_DENIED, 'a/key', 'Permission denied')
+    assert parse_tar_error_line('tar: tab\\there: Cannot read: Input/output error') == \
+        (FILE_ERROR, 'tab\there', 'Input/output error')
+    assert parse_tar_error_line('tar: Exiting with failure status due to previous errors') is None
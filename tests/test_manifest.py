@@ -0,0 +1,55 @@
+from src.core.filelist import FileEntry, decode_path
+from src.core.manifest import ManifestStore
+
+def store(tmp_path, source='u@h:/srv'):
+    return ManifestStore(str(tmp_path / 'manifest.db'), source)
+
+def baseline(manifest, entries):
+    manifest.stage_listing(entries)
+    manifest.commit('full', '2026-01-01T00:00:00')
+
+def test_first_listing_is_all_changed(tmp_path):
+    manifest = store(tmp_path)
+    assert manifest.stage_listing([FileEntry('a', 1, 1.0, 1), FileEntry('b', 2, 2.0, 2)]) == 2
+    assert [entry.path for entry in manifest.iter_changed()] == ['a', 'b']
+
+def test_diff_by_size_mtime_and_inode(tmp_path):
+    manifest = store(tmp_path)
+    baseline(manifest, [FileEntry('same', 1, 1.0, 1), FileEntry('size', 1, 1.0, 2),
+                        FileEntry('mtime', 1, 1.0, 3), FileEntry('inode', 1, 1.0, 4)])
+    manifest.stage_listing([FileEntry('same', 1, 1.0, 1), FileEntry('size', 9, 1.0, 2),
+                            FileEntry('mtime', 1, 5.0, 3), FileEntry('inode', 1, 1.0, 40),
+                            FileEntry('new', 1, 1.0, 5)])
+    assert [entry.path for entry in manifest.iter_changed()] == ['inode', 'mtime', 'new', 'size']
+    assert list(manifest.iter_unchanged()) == ['same']
+
+def test_full_commit_replaces_the_manifest(tmp_path):
+    manifest = store(tmp_path)
+    baseline(manifest, [FileEntry('gone', 1, 1.0, 1), FileEntry('kept', 1, 1.0, 2)])
+    baseline(manifest, [FileEntry('kept', 1, 1.0, 2)])
+    assert manifest.file_count() == 1
+
+def test_partial_commit_merges(tmp_path):
+    manifest = store(tmp_path)
+    baseline(manifest, [FileEntry('a', 1, 1.0, 1), FileEntry('b', 1, 1.0, 2)])
+    manifest.stage_listing([FileEntry('b', 7, 2.0, 2), FileEntry('c', 1, 1.0, 3)])
+    assert list(manifest.iter_unchanged(partial=True)) == ['a']
+    manifest.commit('quick', '2026-01-02T00:00:00', partial=True)
+    assert manifest.file_count() == 3
+    
+    # The merged row is the new baseline for b
+    manifest.stage_listing([FileEntry('b', 7, 2.0, 2)])
+    assert list(manifest.iter_changed()) == []
+
+def test_paths_round_trip_as_raw_bytes(tmp_path):
+    name = decode_path(b'latin\xe9 new\nline')
+    manifest = store(tmp_path)
+    baseline(manifest, [FileEntry(name, 1, 1.0, 1)])
+    manifest.stage_listing([FileEntry(name, 1, 1.0, 1)])
+    assert list(manifest.iter_unchanged()) == [name]
+
+def test_other_source_starts_empty(tmp_path):
+    manifest = store(tmp_path)
+    baseline(manifest, [FileEntry('a', 1, 1.0, 1)])
+    manifest.close()
+    assert store(tmp_path, 'u@other:/srv').file_count() == 0
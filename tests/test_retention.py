@@ -0,0 +1,73 @@
+import os
+
+from src.core.retention import COMPLETE_MARKER, SnapshotPruner, select_snapshots, snapshot_time
+from src.core.state import RunState
+
+def test_snapshot_time():
+    assert snapshot_time('20260315_101500').isoformat() == '2026-03-15T10:15:00'
+    assert snapshot_time('20260315_101500_2').isoformat() == '2026-03-15T10:15:00'
+    assert snapshot_time('.deleting-20260315_101500') is None
+    assert snapshot_time('notes') is None
+
+def test_keep_newest_per_day():
+    names = ['20260301_010000', '20260301_230000', '20260302_120000', '20260303_080000']
+    keep, prune = select_snapshots(names, {'keep_daily': 2})
+    assert keep == ['20260303_080000', '20260302_120000']
+    assert prune == ['20260301_230000', '20260301_010000']
+
+def test_tiers_overlap():
+    # Daily keeps the last two days, weekly and monthly reach further back
+    names = ['20260105_000000', '20260112_000000', '20260201_000000',
+             '20260209_000000', '20260210_000000']
+    keep, prune = select_snapshots(names, {'keep_daily': 2, 'keep_weekly': 3, 'keep_monthly': 2})
+    assert keep == ['20260210_000000', '20260209_000000', '20260201_000000', '20260112_000000']
+    assert prune == ['20260105_000000']
+
+def test_unknown_names_are_never_pruned():
+    keep, prune = select_snapshots(['latest', '20260101_000000', 'tmp'], {'keep_daily': 0})
+    assert keep == []
+    assert prune == ['20260101_000000']
+
+def test_empty_policy_prunes_everything():
+    names = ['20260101_000000', '20260102_000000']
+    assert select_snapshots(names, {}) == ([], ['20260102_000000', '20260101_000000'])
+
+def make_snapshots(tmp_path, complete, incomplete, latest):
+    snapshots = tmp_path / 'snapshots'
+    for name in complete + incomplete:
+        (snapshots / name / 'data').mkdir(parents=True)
+        (snapshots / name / 'data' / 'file').write_text('x')
+    for name in complete:
+        (snapshots / name / COMPLETE_MARKER).touch()
+    os.symlink(snapshots / latest, tmp_path / 'latest')
+    return snapshots
+
+def pruner(tmp_path, **snapshots):
+    return SnapshotPruner({'local_root': str(tmp_path), 'state_dir': str(tmp_path / 'state'),
+                           'snapshots': {'retention': {'keep_daily': 1}, **snapshots}})
+
+def test_plan_counts_only_complete_snapshots(tmp_path):
+    make_snapshots(tmp_path, ['20260101_000000', '20260103_000000'],
+                   ['20260102_000000', '20260104_000000'], latest='20260103_000000')
+    plan = pruner(tmp_path).plan()
+    assert plan['keep'] == ['20260103_000000']
+    assert plan['prune'] == ['20260101_000000']
+    assert plan['failed'] == []
+    assert plan['unfinished'] == ['20260102_000000', '20260104_000000']
+
+def test_prune_failed_spares_newer_and_resumable_runs(tmp_path):
+    run = RunState.create(str(tmp_path / 'state'), 'longterm')
+    make_snapshots(tmp_path, ['20260103_000000'], ['20260101_000000', '20260102_000000', run.run_id],
+                   latest='20260103_000000')
+    os.rename(tmp_path / 'snapshots' / '20260102_000000', tmp_path / 'snapshots' / '20260102_000000_2')
+    plan = pruner(tmp_path, prune_failed=True).plan()
+    assert plan['failed'] == ['20260101_000000', '20260102_000000_2']
+    assert plan['unfinished'] == [run.run_id]
+
+def test_prune_deletes_and_reports(tmp_path):
+    snapshots = make_snapshots(tmp_path, ['20260101_000000', '20260102_000000'], [],
+                               latest='20260102_000000')
+    result = pruner(tmp_path).prune(log_message=lambda message: None)
+    assert result['removed'] == {'snapshots': 1, 'files': 2, 'dirs': 2, 'errors': 0}
+    assert sorted(os.listdir(snapshots)) == ['20260102_000000']
+    assert result['duration'].total_seconds() >= 0
@@ -0,0 +1,72 @@
+import threading
+from datetime import datetime
+
+from src.core.schedule import TransferSchedule, WorkerGate, parse_clock
+
+CONFIG = {
+    'threads': 8,
+    'bwlimit': 0,
+    'schedule': {
+        'enable': True,
+        'windows': [
+            {'start': '09:00', 'end': '18:00', 'days': ['mon', 'tue', 'wed', 'thu', 'fri'],
+             'bwlimit': '20MB/s', 'workers': 4},
+            {'start': '22:00', 'end': '06:00', 'workers': 16},
+        ],
+        'default': {'bwlimit': '50MB/s'},
+    },
+}
+
+def test_parse_clock():
+    assert parse_clock('09:30') == 570
+    assert parse_clock('24:00') == 0
+    # YAML reads an unquoted 18:00 as base-60 1080
+    assert parse_clock(1080) == 1080
+
+def test_weekday_window():
+    # 2026-03-16 is a Monday
+    current = TransferSchedule(CONFIG).current(datetime(2026, 3, 16, 9, 0))
+    assert current['name'] == '09:00-18:00'
+    assert current['bwlimit'] == 20 * 1024 ** 2
+    assert current['workers'] == 4
+
+def test_window_end_is_exclusive():
+    current = TransferSchedule(CONFIG).current(datetime(2026, 3, 16, 18, 0))
+    assert current['name'] == 'default'
+    assert current['workers'] == 8
+    assert current['bwlimit'] == 50 * 1024 ** 2
+
+def test_window_limited_to_days():
+    # Saturday falls back to the default
+    assert TransferSchedule(CONFIG).current(datetime(2026, 3, 21, 12, 0))['name'] == 'default'
+
+def test_window_wraps_midnight():
+    schedule = TransferSchedule(CONFIG)
+    assert schedule.current(datetime(2026, 3, 21, 23, 30))['name'] == '22:00-06:00'
+    assert schedule.current(datetime(2026, 3, 22, 5, 59))['name'] == '22:00-06:00'
+    assert schedule.current(datetime(2026, 3, 22, 6, 0))['name'] == 'default'
+
+def test_max_workers():
+    assert TransferSchedule(CONFIG).max_workers() == 16
+
+def test_schedule_disabled_by_default():
+    schedule = TransferSchedule({'threads': 6})
+    assert not schedule.enabled
+    assert schedule.current()['workers'] == 6
+
+def test_worker_gate_follows_a_raised_limit():
+    gate = WorkerGate(1)
+    entered = threading.Event()
+    
+    def worker():
+        with gate:
+            entered.set()
+            
+    with gate:
+        thread = threading.Thread(target=worker)
+        thread.start()
+        assert not entered.wait(0.1)
+        gate.set_limit(2)
+        assert entered.wait(2)
+    thread.join()
+    assert gate.active == 0
@@ -0,0 +1,71 @@
+from src.core.state import RunState
+
+def test_plan_log_survives_a_reload(tmp_path):
+    run = RunState.create(str(tmp_path), 'full')
+    run.save_plan([], {}, 4, incremental=False, listing_complete=False)
+    first = str(run.run_dir / 'batches' / 'batch_1.txt')
+    second = str(run.run_dir / 'tar' / 'tar_1.txt')
+    run.add_chunk(first, 100)
+    run.add_chunk(second, 20)
+    
+    loaded = RunState.load(run.run_dir)
+    assert loaded.plan['listing_complete'] is False
+    assert loaded.chunk_paths() == [first, second]
+    assert loaded.chunk_bytes() == {first: 100, second: 20}
+
+def test_plan_log_after_saved_chunks(tmp_path):
+    run = RunState.create(str(tmp_path), 'full')
+    saved = str(run.run_dir / 'chunk_1.txt')
+    logged = str(run.run_dir / 'chunk_2.txt')
+    run.save_plan([saved], {saved: 5}, 1)
+    run.add_chunk(logged, 7)
+    assert run.chunk_paths() == [saved, logged]
+    assert run.chunk_bytes() == {saved: 5, logged: 7}
+
+def test_torn_plan_log_line_is_ignored(tmp_path):
+    run = RunState.create(str(tmp_path), 'full')
+    run.add_chunk(str(run.run_dir / 'chunk_1.txt'), 5)
+    with open(run.run_dir / RunState.PLAN_LOG, 'a') as f:
+        f.write('chunk_2.txt\t')
+    assert run.chunk_paths() == [str(run.run_dir / 'chunk_1.txt')]
+
+def test_reset_chunks_forgets_the_previous_pass(tmp_path):
+    run = RunState.create(str(tmp_path), 'full')
+    chunk = str(run.run_dir / 'chunk_1.txt')
+    run.add_chunk(chunk, 5)
+    run.mark_chunk(chunk, True)
+    run.reset_chunks()
+    run.save_plan([], {}, 1)
+    assert run.chunk_paths() == []
+    assert run.chunk_results() == {}
+
+def test_update_plan(tmp_path):
+    run = RunState.create(str(tmp_path), 'full')
+    run.save_plan([], {}, 1, listing_complete=False)
+    run.update_plan(listing_complete=True)
+    assert RunState.load(run.run_dir).plan['listing_complete'] is True
+
+def test_chunk_results_keep_the_latest(tmp_path):
+    run = RunState.create(str(tmp_path), 'full')
+    chunk = str(run.run_dir / 'chunk_1.txt')
+    run.mark_chunk(chunk, False)
+    run.mark_chunk(chunk, True)
+    assert run.chunk_results() == {chunk: True}
+
+def test_incomplete_runs_per_backup_type(tmp_path):
+    longterm = RunState.create(str(tmp_path), 'longterm')
+    longterm.update(status='failed')
+    RunState.create(str(tmp_path), 'quick').update(status='completed')
+    
+    # A completed run of another type does not supersede the longterm run
+    assert [run.run_id for run in RunState.incomplete_runs(str(tmp_path))] == [longterm.run_id]
+    assert RunState.latest_incomplete(str(tmp_path)).run_id == longterm.run_id
+    
+    RunState.create(str(tmp_path), 'longterm').update(status='completed')
+    assert RunState.incomplete_runs(str(tmp_path)) == []
+    assert RunState.latest_incomplete(str(tmp_path)) is None
+
+def test_abandoned_runs_are_not_resumable(tmp_path):
+    RunState.create(str(tmp_path), 'full').update(status='abandoned')
+    running = RunState.create(str(tmp_path), 'quick')
+    assert [run.run_id for run in RunState.incomplete_runs(str(tmp_path))] == [running.run_id]